@@ -0,0 +1,212 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+# set working directory to root of this file
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+MODELS = ["m1a", "m2", "m3", "m4b", "m5", "m6"]
+
+FIRST_BATCH = """
+import time
+
+t0 = time.perf_counter()
+from src.ddm import get_batch_simulator, get_prior
+
+t1 = time.perf_counter()
+for model in {models}:
+    get_batch_simulator(model, parallel={parallel})(get_prior(model)(1), 1)
+t2 = time.perf_counter()
+print(t1 - t0, t2 - t1)
+"""
+
+IMPORTS = """
+import importlib
+import time
+
+t0 = time.perf_counter()
+for module in {modules}:
+    importlib.import_module(module)
+print(time.perf_counter() - t0)
+"""
+
+# Modules imported by each stage of the pipeline, on top of the entry points
+STAGES = {
+    "entry points": ["eval", "train", "simulate", "render", "run_all", "cohort_sbc"],
+    "subject data": ["pandas"],
+    "simulator": ["src.ddm"],
+    "ranks": ["src.ranks"],
+    "plotting": ["src.render", "src.plot_utils"],
+    "networks": ["bayesflow", "src.models"],
+}
+
+ENTRY_POINTS = [
+    "eval.py",
+    "train.py",
+    "simulate.py",
+    "render.py",
+    "run_all.py",
+    "cohort_sbc.py",
+]
+
+
+def legacy_configurator(forward_dict: dict) -> dict:
+    out_dict = {}
+    data = forward_dict["sim_data"].astype(np.float32)
+
+    num_obs = forward_dict["sim_non_batchable_context"]
+    vec_num_obs = np.ones((data.shape[0], 1)) * np.log(num_obs)  # transformed num_obs
+    out_dict["direct_conditions"] = vec_num_obs.astype(np.float32)
+
+    out_dict["parameters"] = forward_dict["prior_draws"].astype(np.float32)
+
+    rt_signed = data[..., 0]
+    cpp = data[..., 1]
+
+    # recode RT as absolute_rt + response
+    response = np.zeros_like(rt_signed, dtype=np.float32)
+    response[rt_signed > 0] = 1.0
+
+    rt_abs = np.abs(rt_signed)
+
+    data_out = np.stack([rt_abs, response, cpp], axis=-1)
+
+    out_dict["summary_conditions"] = data_out
+
+    return out_dict
+
+
+def run_python(code, env):
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return [float(x) for x in out.stdout.split()]
+
+
+def bench_jit(args):
+    """
+    Time to the first simulated batch of every model in a fresh process, once with
+    an empty numba cache (cold) and once with the cache written by the first run
+    (warm).
+    """
+
+    code = FIRST_BATCH.format(models=args.models, parallel=args.parallel)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ, NUMBA_CACHE_DIR=cache_dir)
+        for label in ["cold", "warm"]:
+            import_time, first_batch_time = run_python(code, env)
+            print(
+                f"{label}: import {import_time:.2f}s, "
+                f"first batch of {len(args.models)} models {first_batch_time:.2f}s"
+            )
+
+
+def bench_startup(args):
+    """
+    Import time of every pipeline stage in a fresh process, and wall time of
+    --help of every entry point, including interpreter startup.
+    """
+
+    for stage, modules in STAGES.items():
+        code = IMPORTS.format(modules=modules)
+        try:
+            times = [run_python(code, dict(os.environ))[0] for _ in range(args.repeats)]
+        except subprocess.CalledProcessError as error:
+            print(f"{stage:14s} failed: {error.stderr.strip().splitlines()[-1]}")
+            continue
+        print(f"{stage:14s} {np.median(times):6.2f}s  ({', '.join(modules)})")
+
+    for script in ENTRY_POINTS:
+        times = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            subprocess.run(
+                [sys.executable, script, "--help"], capture_output=True, check=True
+            )
+            times.append(time.perf_counter() - start)
+        print(f"{script + ' --help':24s} {np.median(times):6.2f}s")
+
+
+def time_call(fun, repeats):
+    """Returns the median time of fun() and the peak memory it allocates."""
+
+    fun()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fun()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fun()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return np.median(times), peak
+
+
+def bench_configurator(args):
+    """
+    Time per call and peak allocated memory of the configurator, for the legacy
+    NumPy version and the fused one (fresh outputs and reused buffer views), at
+    the training batch size and at the posterior SBC size.
+    """
+
+    from src.config import cfg
+    from src.ddm import Configurator
+
+    sizes = {
+        "training": (cfg.batch_size, cfg.num_obs_max),
+        "posterior SBC": (200, 2 * cfg.num_test_observations),
+    }
+    configurators = {
+        "legacy": legacy_configurator,
+        "fused": Configurator(),
+        "fused views": Configurator(views=True),
+    }
+
+    rng = np.random.default_rng(0)
+    for label, (batch_size, num_obs) in sizes.items():
+        forward_dict = {
+            "sim_data": rng.normal(size=(batch_size, num_obs, 2)).astype(np.float32),
+            "prior_draws": rng.uniform(size=(batch_size, 7)).astype(np.float32),
+            "sim_non_batchable_context": num_obs,
+        }
+        print(f"{label} ({batch_size} x {num_obs}):")
+        for name, conf in configurators.items():
+            run_time, peak = time_call(lambda: conf(forward_dict), args.repeats)
+            print(
+                f"  {name:12s} {run_time * 1e6:8.1f}us {peak / 1024:8.1f}KiB allocated"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    parser_jit = subparsers.add_parser("jit", help=bench_jit.__doc__)
+    parser_jit.add_argument("--models", nargs="+", default=MODELS, choices=MODELS)
+    parser_jit.add_argument("--parallel", action="store_true")
+    parser_jit.set_defaults(run=bench_jit)
+
+    parser_configurator = subparsers.add_parser(
+        "configurator", help=bench_configurator.__doc__
+    )
+    parser_configurator.add_argument("--repeats", type=int, default=200)
+    parser_configurator.set_defaults(run=bench_configurator)
+
+    parser_startup = subparsers.add_parser("startup", help=bench_startup.__doc__)
+    parser_startup.add_argument("--repeats", type=int, default=5)
+    parser_startup.set_defaults(run=bench_startup)
+
+    args = parser.parse_args()
+    args.run(args)
@@ -0,0 +1,163 @@
+import argparse
+import hashlib
+import os
+import time
+
+from src.argparser import parse_args, shared_parser, simulator_kwargs
+from src.config import cfg
+
+# set working directory to root of this file
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+NUM_PPRED_SAMPLES = 200
+NUM_POSTERIOR_SAMPLES = 500
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description="Run posterior SBC for every subject of a cohort.",
+        parents=[shared_parser()],
+    )
+    group = parser.add_argument_group("cohort")
+
+    group.add_argument(
+        "--subject_dir",
+        type=str,
+        default="data",
+        help="Directory of the subject files.",
+    )
+
+    group.add_argument(
+        "--cohort_batch_size",
+        type=int,
+        default=16,
+        help="Subjects per posterior SBC batch.",
+    )
+
+    group.add_argument(
+        "--results_dir",
+        type=str,
+        default=None,
+        help="Results store "
+        "(default: results/<checkpoint_prefix>_<model>_posteriorsbc).",
+    )
+
+    return parser
+
+
+def posterior_summaries(posterior_samples):
+    """Mean, sd and central 95% interval of posterior samples, per parameter."""
+
+    import numpy as np
+
+    return {
+        "posterior_mean": posterior_samples.mean(axis=1),
+        "posterior_sd": posterior_samples.std(axis=1),
+        "posterior_q025": np.quantile(posterior_samples, 0.025, axis=1),
+        "posterior_q975": np.quantile(posterior_samples, 0.975, axis=1),
+    }
+
+
+def main(args):
+    import numba
+    import numpy as np
+    from src.ddm import configurator, get_batch_simulator
+    from src.ddm.kernel import warm_up
+    from src.ddm.streams import make_generator
+    from src.draw_cache import checkpoint_fingerprint
+    from src.models import load_amortizer
+    from src.posterior_sbc import posterior_sbc_ranks
+    from src.results import ResultsStore
+    from src.subjects import CACHE_DIR, SUBJECT_PATTERN, load_subjects
+
+    if args.num_threads is not None:
+        numba.set_num_threads(args.num_threads)
+
+    if args.warm_up:
+        warm_up(parallel=args.parallel, background=True)
+
+    if args.results_dir is None:
+        args.results_dir = f"results/{args.checkpoint_prefix}_{args.model}_posteriorsbc"
+
+    # one subject cache per data directory
+    subject_dir = os.path.abspath(args.subject_dir)
+    subjects = load_subjects(
+        num_obs=cfg.num_test_observations,
+        pattern=os.path.join(subject_dir, os.path.basename(SUBJECT_PATTERN)),
+        cache_dir=os.path.join(
+            CACHE_DIR, hashlib.sha256(subject_dir.encode()).hexdigest()[:16]
+        ),
+    )
+
+    # a resumed run continues with the seed of the stored results, so that every
+    # subject draws from the streams of that seed
+    if args.seed is None:
+        stored_config = ResultsStore.stored_config(args.results_dir) or {}
+        args.seed = stored_config.get("seed", np.random.SeedSequence().entropy)
+        print(f"Seed: {args.seed}")
+
+    store = ResultsStore(
+        args.results_dir,
+        config=dict(
+            model=args.model,
+            checkpoint=checkpoint_fingerprint(args.checkpoint_name),
+            simulator_backend=args.simulator_backend,
+            simulator=simulator_kwargs(args),
+            seed=args.seed,
+            num_obs=cfg.num_test_observations,
+            num_ppred_samples=NUM_PPRED_SAMPLES,
+            num_posterior_samples=NUM_POSTERIOR_SAMPLES,
+        ),
+    )
+    done = store.done_subjects()
+    todo = [subject for subject in subjects if subject not in done]
+    print(f"{len(subjects)} subjects, {len(done)} done, {len(todo)} to run")
+    if not todo:
+        return
+
+    trainer = load_amortizer(
+        cfg, len(cfg.param_names[args.model]), args.checkpoint_name, configurator
+    )
+    ppred_simulator = get_batch_simulator(
+        args.model,
+        parallel=args.parallel,
+        backend=args.simulator_backend,
+        **simulator_kwargs(args),
+    )
+
+    start = time.perf_counter()
+    for batch_start in range(0, len(todo), args.cohort_batch_size):
+        batch = todo[batch_start : batch_start + args.cohort_batch_size]
+        y_obs = [subjects[subject] for subject in batch]
+        # ranks of every posterior draw given y among its conditional posterior,
+        # counted in chunks without keeping the conditional posterior samples
+        posterior_samples_y, ranks, _ = posterior_sbc_ranks(
+            y_obs=y_obs,
+            trainer=trainer,
+            ppred_simulator=ppred_simulator,
+            num_ppred_samples=NUM_PPRED_SAMPLES,
+            num_posterior_samples=NUM_POSTERIOR_SAMPLES,
+            rngs=[
+                make_generator(np.random.SeedSequence(args.seed, spawn_key=(subject,)))
+                for subject in batch
+            ],
+        )
+
+        store.append(
+            subject_ids=np.array(batch),
+            num_obs=np.array([y.shape[0] for y in y_obs]),
+            ranks=ranks,
+            rank_mean=ranks.mean(axis=1) / NUM_POSTERIOR_SAMPLES,
+            **posterior_summaries(posterior_samples_y),
+        )
+
+        num_done = batch_start + len(batch)
+        minutes = (time.perf_counter() - start) / 60
+        print(
+            f"{num_done}/{len(todo)} subjects, "
+            f"{num_done / minutes:.1f} subjects per minute"
+        )
+
+
+if __name__ == "__main__":
+    main(parse_args(get_parser()))
@@ -1,158 +1,307 @@
+import argparse
 import os
 from functools import partial
 
-import bayesflow as bf
-import matplotlib.pyplot as plt
-import numpy as np
-import pandas as pd
-from src.argparser import parse_args
+from src.argparser import parse_args, shared_parser, simulator_kwargs
 from src.config import cfg
-from src.ddm import (
-    configurator,
-    get_batch_simulator,
-    get_prior,
-    random_num_obs,
-    random_num_obs_mixture,
-)
-from src.models import get_amortizer
-from src.posterior_sbc import posterior_sbc
+
+# Heavy dependencies (bayesflow/TensorFlow, numba, pandas, matplotlib) are imported
+# by the functions that need them, so that importing this module, --help and
+# plot-only runs start quickly.
 
 # set working directory to root of this file
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
 
-def preprocess_data(df):
-    df["response_corr"] = df["response_corr"].replace(0, -1)
-    df = np.array([df["response_time"] * df["response_corr"], df["n200lat"]]).T
-    df = df[df[:, 1] > -10]
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description="Evaluate a trained model on simulated and real data.",
+        parents=[shared_parser()],
+    )
+    group = parser.add_argument_group("evaluation")
+
+    group.add_argument(
+        "--draw_cache_dir",
+        type=str,
+        default="cache/draws",
+        help="Cache of the posterior draws, reused by runs with the "
+        "same checkpoint, inputs and --seed.",
+    )
 
-    df = df[: cfg.num_test_observations]
+    group.add_argument(
+        "--draw_cache_size_gb",
+        type=float,
+        default=5.0,
+        help="Size limit of the draw cache; least recently used entries are "
+        "evicted beyond it (0: no caching).",
+    )
 
-    return df
+    group.add_argument(
+        "--render_workers",
+        type=int,
+        default=None,
+        help="Processes rendering the figures (default: all cores).",
+    )
 
+    group.add_argument(
+        "--subjects",
+        type=int,
+        nargs="+",
+        default=[1, 3, 6],
+        help="Subject ids to evaluate, see src.subjects.",
+    )
 
-subject_indices = [1, 3, 6]
+    return parser
 
-real_data = {
-    subject_idx: preprocess_data(
-        pd.read_csv(
-            f"data/sub-{subject_idx:03}_task-pdm_acq-outsideMRT_runs_beh_n200lat.csv"
-        )
+
+def load_real_data(args):
+    """
+    Returns the first num_test_observations preprocessed trials of the subjects in
+    args.subjects, memory-mapped from the subject cache (see src.subjects).
+    """
+
+    from src.subjects import load_subjects
+
+    return load_subjects(args.subjects, num_obs=cfg.num_test_observations)
+
+
+def eval_outputs(args):
+    """Returns the plot files written by main, used to skip finished runs."""
+
+    plot_path = f"plots/{args.checkpoint_prefix}_{args.model}"
+    return (
+        [f"{plot_path}_loss_history.png"]
+        + [
+            f"{plot_path}_{kind}_{label}.png"
+            for label in ["N", "2N"]
+            for kind in ["priorsbc", "recovery"]
+        ]
+        + [
+            f"{plot_path}_posteriorsbc_{subject_idx}.png"
+            for subject_idx in args.subjects
+        ]
     )
-    for subject_idx in subject_indices
-}
 
-print([real_observations.shape for real_observations in real_data.values()])
 
+def closed_world_draws(args, trainer, num_obs, streams):
+    """Simulates test data sets and samples their posteriors."""
 
-if __name__ == "__main__":
-    args = parse_args()
+    from src.ddm import get_batch_simulator, get_prior
+
+    theta_true = get_prior(args.model, rng=streams["prior"])(cfg.num_test_datasets)
+    y_true = get_batch_simulator(
+        args.model,
+        parallel=args.parallel,
+        backend=args.simulator_backend,
+        rng=streams["simulator"],
+        **simulator_kwargs(args),
+    )(
+        theta_true, num_obs
+    )  # For each drawn paramter vector, sample num_obs observations from the simulator
+    test_data = trainer.configurator(
+        {
+            "prior_draws": theta_true,
+            "sim_data": y_true,
+            "sim_non_batchable_context": num_obs,
+        }
+    )
+
+    posterior_samples = trainer.amortizer.sample(
+        test_data, n_samples=cfg.num_posterior_samples
+    )
+    return {"theta_true": theta_true, "posterior_samples": posterior_samples}
+
+
+def posterior_sbc_draws(args, trainer, y_obs, streams):
+    """Runs posterior SBC for all observed data sets."""
+
+    from src.ddm import get_batch_simulator
+    from src.posterior_sbc import posterior_sbc_batched
+
+    posterior_samples_y, conditional_posterior_samples = posterior_sbc_batched(
+        y_obs=y_obs,
+        trainer=trainer,
+        ppred_simulator=get_batch_simulator(
+            args.model,
+            parallel=args.parallel,
+            backend=args.simulator_backend,
+            rng=streams["simulator"],
+            **simulator_kwargs(args),
+        ),
+        num_ppred_samples=200,
+        num_posterior_samples=500,
+    )
+    return {
+        "posterior_samples_y": posterior_samples_y,
+        "conditional_posterior_samples": conditional_posterior_samples,
+    }
+
+
+def main(args, real_data):
+    import numba
+    import numpy as np
+    from src.artefacts import (
+        artefact_dir,
+        loss_artefact,
+        recovery_artefact,
+        save_artefact,
+        sbc_artefact,
+        write_manifest,
+    )
+    from src.ddm import configurator
+    from src.ddm.kernel import warm_up
+    from src.ddm.streams import make_streams
+    from src.draw_cache import DrawCache, array_hash, checkpoint_fingerprint
+    from src.models import load_amortizer
+    from src.plot_utils import distinct_colors
+    from src.render import render_figures
+
+    if args.num_threads is not None:
+        numba.set_num_threads(args.num_threads)
+
+    if args.warm_up:
+        warm_up(parallel=args.parallel, background=True)
 
     args.plot_path = f"plots/{args.checkpoint_prefix}_{args.model}"
     os.makedirs(args.plot_path, exist_ok=True)
 
+    # Numeric results are written to artefact files first, and the figures are
+    # rendered from them at the end (see render.py for plot-only re-runs)
+    artefacts = artefact_dir(args.checkpoint_prefix, args.model)
+    figures = []
+
+    def add_figure(kind, name, artefact, **options):
+        path = os.path.join(artefacts, f"{name}.npz")
+        save_artefact(path, **artefact)
+        figures.append(
+            dict(
+                kind=kind,
+                artefact=path,
+                output=f"{args.plot_path}_{name}.png",
+                options=options,
+            )
+        )
+
     param_names = cfg.param_names[args.model]
 
     num_params = len(param_names)
+    # one color per parameter; the highlight palette of the paper figures leaves
+    # most parameters gray
+    colors = distinct_colors(num_params)
 
-    if args.nobs_fun == "uniform":
-        context_gen = bf.simulation.ContextGenerator(
-            non_batchable_context_fun=partial(
-                random_num_obs, num_obs_min=cfg.num_obs_min, num_obs_max=cfg.num_obs_max
-            )
-        )
-    elif args.nobs_fun == "mixture":
-        context_gen = bf.simulation.ContextGenerator(
-            non_batchable_context_fun=partial(
-                random_num_obs_mixture, num_obs_target=cfg.num_test_observations
-            )
-        )
-    else:
-        raise ValueError("Invalid nobs_fun")
+    # Restores only the amortizer, as evaluation never trains or simulates through
+    # a Trainer; the result is passed on wherever a trainer is expected
+    trainer = load_amortizer(cfg, num_params, args.checkpoint_name, configurator)
 
-    prior = bf.simulation.Prior(batch_prior_fun=get_prior(args.model))
-    simulator = bf.simulation.Simulator(
-        batch_simulator_fun=get_batch_simulator(args.model),
-        context_generator=context_gen,
+    # Loss history
+    add_figure(
+        "losses", "loss_history", loss_artefact(trainer.loss_history.get_plottable())
     )
-    generative_model = bf.simulation.GenerativeModel(prior=prior, simulator=simulator)
 
-    amortizer = get_amortizer(cfg, num_params)
-
-    trainer = bf.trainers.Trainer(
-        amortizer=amortizer,
-        generative_model=generative_model,
-        configurator=configurator,
-        checkpoint_path=args.checkpoint_name,
-        max_to_keep=1,
+    # Posterior draws are reused across runs with the same checkpoint, inputs and
+    # seed. Without a seed, every run draws afresh.
+    draw_cache = None
+    if args.seed is not None and args.draw_cache_size_gb > 0:
+        draw_cache = DrawCache(
+            args.draw_cache_dir, max_bytes=int(args.draw_cache_size_gb * 2**30)
+        )
+    cache_key = dict(
+        checkpoint=checkpoint_fingerprint(args.checkpoint_name),
+        model=args.model,
+        simulator_backend=args.simulator_backend,
+        simulator=simulator_kwargs(args),
+        seed=args.seed,
     )
 
-    # Loss history
-    f = bf.diagnostics.plot_losses(trainer.loss_history.get_plottable())
-    f.savefig(f"{args.plot_path}_loss_history.png")
-    plt.close()
+    def cached(key, compute):
+        if draw_cache is None:
+            return compute()
+        return draw_cache.cached(dict(cache_key, **key), compute)
+
+    # Every evaluation task draws from its own streams, so that cached tasks do not
+    # shift the random numbers of the others
+    def task_streams(task_idx):
+        return make_streams(np.random.SeedSequence(args.seed, spawn_key=(task_idx,)))
 
     # Closed-world evaluation on data from the joint model used for training
     # Evaluate on n_obs equal to the number of observations in the real data, and
     # also on 2N observations because we to evaluate on 2N for PosteriorSBC
-    for label, num_obs in {
-        "N": cfg.num_test_observations,
-        "2N": 2 * cfg.num_test_observations,
-    }.items():
-        theta_true = get_prior(args.model)(cfg.num_test_datasets)
-        y_true = get_batch_simulator(
-            args.model
-        )(
-            theta_true, num_obs
-        )  # For each drawn paramter vector, sample num_obs observations from the simulator
-        test_data = trainer.configurator(
-            {
-                "prior_draws": theta_true,
-                "sim_data": y_true,
-                "sim_non_batchable_context": num_obs,
-            }
-        )
-
-        posterior_samples = trainer.amortizer.sample(
-            test_data, n_samples=cfg.num_posterior_samples
+    for task_idx, (label, num_obs) in enumerate(
+        {
+            "N": cfg.num_test_observations,
+            "2N": 2 * cfg.num_test_observations,
+        }.items()
+    ):
+        draws = cached(
+            dict(
+                task="closed_world",
+                num_obs=num_obs,
+                num_datasets=cfg.num_test_datasets,
+                num_samples=cfg.num_posterior_samples,
+            ),
+            partial(closed_world_draws, args, trainer, num_obs, task_streams(task_idx)),
         )
+        theta_true = draws["theta_true"]
+        posterior_samples = draws["posterior_samples"]
 
         # PriorSBC
-        f = bf.diagnostics.plot_sbc_ecdf(
-            posterior_samples, theta_true, difference=True, stacked=True
+        add_figure(
+            "sbc_ecdf",
+            f"priorsbc_{label}",
+            sbc_artefact(posterior_samples, theta_true),
+            param_names=param_names,
+            rank_ecdf_colors=colors,
+            difference=True,
+            hide_ticks=False,
         )
-        f.savefig(f"{args.plot_path}_priorsbc_{label}.png")
-        plt.close()
 
         # Recovery of the true parameters
-        f = bf.diagnostics.plot_recovery(
-            posterior_samples,
-            theta_true,
+        add_figure(
+            "recovery",
+            f"recovery_{label}",
+            recovery_artefact(posterior_samples, theta_true),
             param_names=param_names,
-            add_r2=False,
         )
-        f.savefig(f"{args.plot_path}_recovery_{label}.png")
-        plt.close()
-
-    for subject_idx, y_obs in real_data.items():
-        # Open-world evaluation on real data
-        # PosteriorSBC
-        posterior_samples_y, conditional_posterior_samples = posterior_sbc(
-            y_obs=y_obs,
-            trainer=trainer,
-            ppred_simulator=get_batch_simulator(args.model),
+
+    # Open-world evaluation on real data
+    # PosteriorSBC, for all subjects at once
+    y_obs = list(real_data.values())
+    draws = cached(
+        dict(
+            task="posterior_sbc",
+            data=array_hash(*y_obs),
             num_ppred_samples=200,
             num_posterior_samples=500,
-        )
+        ),
+        partial(posterior_sbc_draws, args, trainer, y_obs, task_streams(2)),
+    )
+    posterior_samples_y = draws["posterior_samples_y"]
+    conditional_posterior_samples = draws["conditional_posterior_samples"]
 
-        f = bf.diagnostics.plot_sbc_ecdf(
-            conditional_posterior_samples,
-            posterior_samples_y,
+    for i, subject_idx in enumerate(real_data):
+        add_figure(
+            "sbc_ecdf",
+            f"posteriorsbc_{subject_idx}",
+            sbc_artefact(conditional_posterior_samples[i], posterior_samples_y[i]),
+            param_names=param_names,
+            rank_ecdf_colors=colors,
             difference=True,
-            stacked=True,
+            hide_ticks=False,
         )
-        f.savefig(f"{args.plot_path}_posteriorsbc_{subject_idx}.png")
 
         print(f"Done with subject {subject_idx}")
 
     print("Done with all subjects")
+
+    write_manifest(artefacts, figures)
+    render_figures(figures, num_workers=args.render_workers)
+
+
+if __name__ == "__main__":
+    args = parse_args(get_parser())
+
+    real_data = load_real_data(args)
+
+    print([real_observations.shape for real_observations in real_data.values()])
+
+    main(args, real_data)
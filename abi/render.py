@@ -0,0 +1,31 @@
+import argparse
+import os
+
+from src.artefacts import artefact_dir, read_manifest
+from src.render import render_figures
+
+# set working directory to root of this file
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+MODELS = ["m1a", "m2", "m3", "m4b", "m5", "m6"]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Render the figures of eval.py from its saved artefacts, "
+        "without re-running the amortizer."
+    )
+    parser.add_argument("--models", type=str, nargs="+", default=MODELS)
+    parser.add_argument("--checkpoint_prefix", type=str, default="affine_lowN")
+    parser.add_argument("--num_workers", type=int, default=None)
+    args = parser.parse_args()
+
+    figures = []
+    for model in args.models:
+        directory = artefact_dir(args.checkpoint_prefix, model)
+        if not os.path.exists(directory):
+            print(f"{model}: no artefacts in {directory}")
+            continue
+        figures += read_manifest(directory)
+
+    for output in render_figures(figures, num_workers=args.num_workers):
+        print(output)
@@ -0,0 +1,205 @@
+import argparse
+import os
+import sys
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+
+# set working directory to root of this file
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+MODELS = ["m1a", "m2", "m3", "m4b", "m5", "m6"]
+
+# Per-process state of the pool workers, set by init_worker
+_real_data = None
+_num_threads = None
+
+
+def init_worker(real_data, num_threads, parallel):
+    """
+    Sets up a pool worker once for all of its tasks: the subject data is loaded
+    by the parent and shared with every worker, and the simulator kernels are
+    compiled (or loaded from the numba cache) before the first task.
+    """
+
+    global _real_data, _num_threads
+    _real_data = real_data
+    _num_threads = num_threads
+
+    import numba
+    from src.ddm.kernel import warm_up
+
+    numba.set_num_threads(min(num_threads, numba.config.NUMBA_NUM_THREADS))
+    warm_up(parallel=parallel)
+
+
+def stage_parser(stage):
+    if stage == "train":
+        from train import get_parser
+    else:
+        from eval import get_parser
+    return get_parser()
+
+
+def parse_stage_args(stage, argv):
+    """Parses the options of train.py or eval.py, skipping those of the other."""
+
+    from src.argparser import parse_args
+
+    parser = stage_parser(stage)
+    args = parse_args(parser, argv, ignore_unknown=True)
+    if stage == "train":
+        from train import check_args
+
+        check_args(parser, args)
+    return args
+
+
+def run_task(stage, argv):
+    """Runs train.py or eval.py with the given command line in this worker."""
+
+    args = parse_stage_args(stage, argv)
+    if stage == "train":
+        import train
+
+        train.main(args)
+    else:
+        import eval as evaluation
+
+        # the renderers share the cores of this worker
+        if args.render_workers is None or args.render_workers > _num_threads:
+            args.render_workers = _num_threads
+
+        evaluation.main(args, _real_data)
+
+
+def is_done(stage, argv):
+    args = parse_stage_args(stage, argv)
+    if stage == "train":
+        from train import TRAIN_DONE
+
+        return os.path.exists(os.path.join(args.checkpoint_name, TRAIN_DONE))
+
+    from eval import eval_outputs
+
+    return all(os.path.exists(path) for path in eval_outputs(args))
+
+
+def parse_orchestrator_args():
+    parser = argparse.ArgumentParser(
+        description="Train and evaluate several models on this machine. "
+        "Unknown arguments are passed on to train.py and eval.py."
+    )
+    parser.add_argument("--models", type=str, nargs="+", default=MODELS)
+    parser.add_argument(
+        "--train",
+        action="store_true",
+        help="Train the models before evaluating them.",
+    )
+    parser.add_argument("--checkpoint_prefix", type=str, default="affine_lowN")
+    parser.add_argument(
+        "--threads_per_worker",
+        type=int,
+        default=4,
+        help="Numba threads and figure renderers of every worker.",
+    )
+    parser.add_argument(
+        "--num_workers",
+        type=int,
+        default=None,
+        help="Size of the process pool (default: cores / threads_per_worker).",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rerun stages whose outputs already exist.",
+    )
+    return parser.parse_known_args()
+
+
+if __name__ == "__main__":
+    args, script_args = parse_orchestrator_args()
+
+    for model in args.models:
+        if model not in MODELS:
+            raise ValueError(f"Unknown model: {model}")
+
+    # every option is passed to both scripts, so it must be known to one of them
+    unknown = None
+    for stage in ["train", "eval"]:
+        _, extras = stage_parser(stage).parse_known_args(["--model=m1a"] + script_args)
+        stage_unknown = {arg for arg in extras if arg.startswith("-")}
+        unknown = stage_unknown if unknown is None else unknown & stage_unknown
+    if unknown:
+        sys.exit(f"Unrecognized arguments: {' '.join(sorted(unknown))}")
+
+    stages = ["train", "eval"] if args.train else ["eval"]
+    # reject invalid options here rather than in the pool workers
+    for stage in stages:
+        parse_stage_args(stage, ["--model=m1a"] + script_args)
+
+    argvs = {
+        model: [f"--model={model}", f"--checkpoint_prefix={args.checkpoint_prefix}"]
+        + script_args
+        for model in args.models
+    }
+
+    # only the stages with missing outputs are run, in order per model
+    pending = {
+        model: [
+            stage for stage in stages if args.force or not is_done(stage, argvs[model])
+        ]
+        for model in args.models
+    }
+    for model, model_stages in pending.items():
+        print(f"{model}: {', '.join(model_stages) or 'done'}")
+
+    num_workers = args.num_workers
+    if num_workers is None:
+        num_workers = max(1, os.cpu_count() // args.threads_per_worker)
+    num_workers = min(num_workers, max(1, sum(map(bool, pending.values()))))
+
+    real_data = None
+    if any("eval" in model_stages for model_stages in pending.values()):
+        from eval import load_real_data
+
+        # the subjects are shared, hence taken from the first model's arguments
+        real_data = load_real_data(parse_stage_args("eval", argvs[args.models[0]]))
+
+    failed = []
+    # spawn, since TensorFlow is not fork-safe
+    with ProcessPoolExecutor(
+        max_workers=num_workers,
+        mp_context=get_context("spawn"),
+        initializer=init_worker,
+        initargs=(real_data, args.threads_per_worker, "--parallel" in script_args),
+    ) as pool:
+
+        def submit(model):
+            stage = pending[model].pop(0)
+            future = pool.submit(run_task, stage, argvs[model])
+            running[future] = (model, stage)
+
+        running = {}
+        for model in args.models:
+            if pending[model]:
+                submit(model)
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                model, stage = running.pop(future)
+                try:
+                    future.result()
+                except Exception:
+                    traceback.print_exc()
+                    print(f"{model}: {stage} failed")
+                    failed.append((model, stage))
+                    continue
+                print(f"{model}: {stage} done")
+                if pending[model]:
+                    submit(model)
+
+    if failed:
+        print(f"Failed: {failed}")
+        sys.exit(1)
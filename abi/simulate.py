@@ -0,0 +1,95 @@
+import argparse
+import os
+from functools import partial
+
+from src.argparser import parse_args, shared_parser, simulator_kwargs
+from src.config import cfg
+
+# set working directory to root of this file
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description="Simulate a bank of training data sets.", parents=[shared_parser()]
+    )
+    group = parser.add_argument_group("bank")
+
+    group.add_argument(
+        "--bank_dir",
+        type=str,
+        default=None,
+        help="Directory of the bank (default: data/banks/<model>).",
+    )
+
+    group.add_argument(
+        "--bank_shards",
+        type=int,
+        default=100,
+        help="Number of shards written to the bank.",
+    )
+
+    group.add_argument(
+        "--bank_shard_size",
+        type=int,
+        default=10000,
+        help="Number of data sets per shard of the bank.",
+    )
+
+    return parser
+
+
+def main(args):
+    # imported here, so that --help does not load numba
+    import numba
+    from src.bank import bank_simulator, write_bank
+    from src.ddm import (
+        get_batch_simulator,
+        get_prior,
+        random_num_obs,
+        random_num_obs_mixture,
+    )
+    from src.ddm.kernel import warm_up
+
+    if args.num_threads is not None:
+        numba.set_num_threads(args.num_threads)
+
+    if args.warm_up:
+        warm_up(parallel=args.parallel, background=True)
+
+    if args.bank_dir is None:
+        args.bank_dir = f"data/banks/{args.model}"
+
+    if args.nobs_fun == "uniform":
+        num_obs_fun = partial(
+            random_num_obs, num_obs_min=cfg.num_obs_min, num_obs_max=cfg.num_obs_max
+        )
+    elif args.nobs_fun == "mixture":
+        num_obs_fun = partial(
+            random_num_obs_mixture, num_obs_target=cfg.num_test_observations
+        )
+    else:
+        raise ValueError("Invalid nobs_fun")
+
+    write_bank(
+        args.bank_dir,
+        args.model,
+        prior=get_prior(args.model),
+        batch_simulator=get_batch_simulator(
+            args.model,
+            parallel=args.parallel,
+            backend=args.simulator_backend,
+            **simulator_kwargs(args),
+        ),
+        num_obs_fun=num_obs_fun,
+        num_shards=args.bank_shards,
+        shard_size=args.bank_shard_size,
+        seed=args.seed,
+        simulator=bank_simulator(
+            args.model, args.simulator_backend, **simulator_kwargs(args)
+        ),
+    )
+
+
+if __name__ == "__main__":
+    main(parse_args(get_parser()))
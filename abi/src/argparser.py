@@ -1,10 +1,17 @@
 import argparse
+import random
 
-import numpy as np
 
+def shared_parser():
+    """
+    Returns the parent parser of the model and simulator options shared by the
+    scripts. Every script adds its own options in an argument group, e.g.
 
-def parse_args(args=None):
-    parser = argparse.ArgumentParser()
+        parser = argparse.ArgumentParser(parents=[shared_parser()])
+        group = parser.add_argument_group("training")
+    """
+
+    parser = argparse.ArgumentParser(add_help=False)
 
     parser.add_argument(
         "--model",
@@ -17,7 +24,7 @@ def parse_args(args=None):
     parser.add_argument(
         "--checkpoint_prefix",
         type=str,
-        default=f"UNNAMED_{np.random.randint(1e4):04d}",
+        default=f"UNNAMED_{random.randrange(10**4):04d}",
     )
 
     parser.add_argument(
@@ -28,7 +35,93 @@ def parse_args(args=None):
         choices=["uniform", "mixture"],
     )
 
-    args = parser.parse_args(args=args)
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="Simulate the data sets of a batch in parallel on all numba threads.",
+    )
+
+    parser.add_argument(
+        "--simulator_backend",
+        type=str,
+        default="euler",
+        help="Simulation engine for the diffusion model.",
+        choices=["euler", "lockstep", "exact", "adaptive"],
+    )
+
+    parser.add_argument(
+        "--warm_up",
+        action="store_true",
+        help="Load or compile the simulation kernels in a background thread at startup.",
+    )
+
+    parser.add_argument(
+        "--num_threads",
+        type=int,
+        default=None,
+        help="Number of numba threads used by the parallel simulator (default: all).",
+    )
+
+    parser.add_argument(
+        "--max_steps",
+        type=int,
+        default=0,
+        help="Step budget per trial of the euler and adaptive backends (0: none).",
+    )
+
+    parser.add_argument(
+        "--censoring",
+        type=str,
+        default="clamp",
+        help="Policy for trials that exhaust the step budget.",
+        choices=["mark", "resample", "clamp"],
+    )
+
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=1e-5,
+        help="Neglected crossing probability of the adaptive backend; larger "
+        "values are faster and less accurate.",
+    )
+
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Seed of the prior, context and simulator streams (default: random).",
+    )
+
+    return parser
+
+
+def simulator_kwargs(args) -> dict:
+    """
+    Returns the keyword arguments of get_batch_simulator set by the shared
+    simulator options, besides the backend and parallel.
+    """
+
+    if args.simulator_backend == "lockstep":
+        return {}
+    kwargs = dict(max_steps=args.max_steps, censoring=args.censoring)
+    if args.simulator_backend == "adaptive":
+        kwargs["tolerance"] = args.tolerance
+    return kwargs
+
+
+def parse_args(parser=None, args=None, ignore_unknown=False):
+    """
+    Parses the command line with parser (default: the shared options only) and
+    adds the checkpoint_name. With ignore_unknown, options of other scripts are
+    skipped, for command lines shared by several scripts (see run_all.py).
+    """
+
+    if parser is None:
+        parser = argparse.ArgumentParser(parents=[shared_parser()])
+    if ignore_unknown:
+        args, _ = parser.parse_known_args(args=args)
+    else:
+        args = parser.parse_args(args=args)
 
     args.checkpoint_name = f"checkpoints/{args.checkpoint_prefix}_{args.model}"
 
@@ -0,0 +1,84 @@
+import json
+import os
+
+import numpy as np
+
+from .ecdf_bands import ecdf_bands
+from .io_utils import atomic_save
+
+# Default location of the artefacts, relative to the abi directory
+ARTEFACT_DIR = "artefacts"
+
+MANIFEST_FILE = "figures.json"
+
+
+def artefact_dir(checkpoint_prefix: str, model_name: str) -> str:
+    return os.path.join(ARTEFACT_DIR, f"{checkpoint_prefix}_{model_name}")
+
+
+def save_artefact(path: str, **arrays):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_save(path) as tmp_path:
+        np.savez(tmp_path, **arrays)
+
+
+def load_artefact(path: str) -> dict:
+    with np.load(path) as artefact:
+        return {name: artefact[name] for name in artefact.files}
+
+
+def write_manifest(directory: str, figures: list):
+    """
+    Writes the list of figures of an evaluation run. Every figure is a dict with
+    the renderer 'kind', the 'artefact' file holding its data, the 'output' image
+    file and the plotting 'options'.
+    """
+
+    with atomic_save(os.path.join(directory, MANIFEST_FILE)) as tmp_path:
+        with open(tmp_path, "w") as f:
+            json.dump(figures, f, indent=2)
+
+
+def read_manifest(directory: str) -> list:
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        return json.load(f)
+
+
+def loss_artefact(loss_history) -> dict:
+    """Returns the training losses of bayesflow's LossHistory.get_plottable()."""
+
+    if isinstance(loss_history, dict):
+        loss_history = loss_history["train_losses"]
+    return {
+        "losses": loss_history.to_numpy(),
+        "loss_names": np.array(loss_history.columns, dtype=str),
+    }
+
+
+def sbc_artefact(post_samples, prior_samples, **bands_kwargs) -> dict:
+    """
+    Returns the fractional SBC ranks and the simultaneous ECDF bands (z, L, H) for
+    their number of data sets.
+    """
+
+    # imported here, so that loading artefacts does not load numba
+    from .ranks import fractional_ranks
+
+    ranks = fractional_ranks(post_samples, prior_samples)
+    alpha, z, L, H = ecdf_bands(ranks.shape[0], **bands_kwargs)
+    return {"ranks": ranks, "alpha": alpha, "z": z, "L": L, "H": H}
+
+
+def recovery_artefact(post_samples, prior_samples) -> dict:
+    """
+    Returns the true parameters with the posterior medians and median absolute
+    deviations, as shown in bayesflow's plot_recovery.
+    """
+
+    estimate = np.median(post_samples, axis=1)
+    uncertainty = np.median(np.abs(post_samples - estimate[:, np.newaxis]), axis=1)
+    return {
+        "true": np.asarray(prior_samples),
+        "estimate": estimate,
+        "uncertainty": uncertainty,
+    }
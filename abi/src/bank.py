@@ -0,0 +1,204 @@
+import os
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from .ddm import get_simulator_settings
+from .ddm.streams import make_streams
+from .io_utils import INDEX_FILE, read_index, write_index
+
+
+def shard_paths(bank_dir: str, shard_idx: int) -> dict:
+    """Returns the paths of the arrays of a shard."""
+    return {
+        key: os.path.join(bank_dir, f"shard_{shard_idx:05d}_{key}.npy")
+        for key in ["prior_draws", "sim_data"]
+    }
+
+
+def bank_simulator(model_name: str, backend: str, layout: str = "signed", **kwargs):
+    """
+    Returns the simulator settings a bank is recorded with in its index: the
+    backend, the output layout, the simulator variant of the model (step size,
+    bounds, N200 link and contamination) and further simulator keyword arguments
+    (e.g. max_steps, censoring).
+    """
+    return dict(
+        backend=backend, layout=layout, **get_simulator_settings(model_name), **kwargs
+    )
+
+
+def check_simulator(bank_dir: str, index: dict, simulator: dict):
+    """Raises a ValueError if a bank was not simulated with the given settings."""
+
+    stored = index.get("simulator")
+    if stored is None:
+        raise ValueError(f"{bank_dir} records no simulator settings")
+    differing = sorted(
+        key
+        for key in set(stored) | set(simulator)
+        if stored.get(key) != simulator.get(key)
+    )
+    if differing:
+        raise ValueError(
+            f"{bank_dir} was simulated with other simulator settings: "
+            + ", ".join(
+                f"{key}={stored.get(key)!r}, not {simulator.get(key)!r}"
+                for key in differing
+            )
+        )
+
+
+def write_bank(
+    bank_dir,
+    model_name,
+    prior,
+    batch_simulator,
+    num_obs_fun,
+    num_shards,
+    shard_size,
+    seed=None,
+    chunk_size=1000,
+    simulator=None,
+):
+    """
+    Simulates a bank of num_shards * shard_size data sets into bank_dir.
+
+    Every shard holds shard_size data sets with a common number of observations,
+    drawn from num_obs_fun, as memory-mapped .npy files of prior draws and sim_data.
+    Shards are simulated chunk_size data sets at a time, so memory use does not
+    grow with the shard size. index.json lists the completed shards; an existing
+    bank of the same model is extended, skipping the shards it already holds.
+
+    prior, batch_simulator and num_obs_fun take an rng keyword. Each shard draws
+    from its own streams (see src.ddm.streams), spawned from seed by shard index,
+    so a bank is reproducible from its seed however often it was resumed.
+
+    simulator holds the settings batch_simulator runs with (see bank_simulator).
+    They are recorded in index.json, and an existing bank is only extended with
+    the same settings.
+    """
+
+    os.makedirs(bank_dir, exist_ok=True)
+    if os.path.exists(os.path.join(bank_dir, INDEX_FILE)):
+        index = read_index(bank_dir)
+        if index["model"] != model_name:
+            raise ValueError(
+                f"{bank_dir} holds a bank of model {index['model']}, not {model_name}"
+            )
+        if simulator is not None:
+            check_simulator(bank_dir, index, simulator)
+    else:
+        index = dict(model=model_name, simulator=simulator, shards=[])
+
+    shard_seeds = np.random.SeedSequence(seed).spawn(num_shards)
+    for shard_idx in range(len(index["shards"]), num_shards):
+        streams = make_streams(shard_seeds[shard_idx])
+        num_obs = int(num_obs_fun(rng=streams["context"]))
+        paths = shard_paths(bank_dir, shard_idx)
+        prior_draws = None
+        sim_data = None
+
+        for start in range(0, shard_size, chunk_size):
+            stop = min(start + chunk_size, shard_size)
+            theta = prior(stop - start, rng=streams["prior"])
+            y = batch_simulator(theta, num_obs, rng=streams["simulator"])
+            if prior_draws is None:
+                prior_draws = open_memmap(
+                    paths["prior_draws"],
+                    mode="w+",
+                    dtype=np.float32,
+                    shape=(shard_size, theta.shape[1]),
+                )
+                sim_data = open_memmap(
+                    paths["sim_data"],
+                    mode="w+",
+                    dtype=np.float32,
+                    shape=(shard_size,) + y.shape[1:],
+                )
+            prior_draws[start:stop] = theta
+            sim_data[start:stop] = y
+
+        prior_draws.flush()
+        sim_data.flush()
+        del prior_draws, sim_data
+
+        index["shards"].append(dict(num_obs=num_obs, size=shard_size))
+        write_index(bank_dir, index)
+        print(f"shard {shard_idx + 1}/{num_shards}: {shard_size} x {num_obs} obs")
+
+    return index
+
+
+class SimulationBank:
+    """
+    Generative model that streams mini-batches from a bank written by write_bank,
+    in place of a bf.simulation.GenerativeModel in the trainer.
+
+    A pass over the bank visits every data set once: each shard is shuffled and cut
+    into batches, and the batches of all shards are visited in random order. All
+    data sets of a batch come from one shard, so they share the number of
+    observations, as in online training.
+
+    If model_name or simulator (see bank_simulator) are given, the bank must have
+    been written for that model and with those simulator settings.
+    """
+
+    def __init__(self, bank_dir: str, model_name: str = None, rng=None, simulator=None):
+        index = read_index(bank_dir)
+        if model_name is not None and index["model"] != model_name:
+            raise ValueError(
+                f"{bank_dir} holds a bank of model {index['model']}, not {model_name}"
+            )
+        if simulator is not None:
+            check_simulator(bank_dir, index, simulator)
+
+        self.num_obs = [shard["num_obs"] for shard in index["shards"]]
+        self.shards = [
+            {
+                key: np.load(path, mmap_mode="r")
+                for key, path in shard_paths(bank_dir, shard_idx).items()
+            }
+            for shard_idx in range(len(index["shards"]))
+        ]
+        if not self.shards:
+            raise ValueError(f"{bank_dir} holds no completed shards")
+
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.batches = []
+        self.batch_size = None
+
+    def __len__(self):
+        return sum(shard["prior_draws"].shape[0] for shard in self.shards)
+
+    def _new_pass(self, batch_size):
+        # sorted indices read the memory maps front to back
+        self.batches = [
+            (shard_idx, np.sort(indices))
+            for shard_idx, shard in enumerate(self.shards)
+            for indices in np.array_split(
+                self.rng.permutation(shard["prior_draws"].shape[0]),
+                max(1, shard["prior_draws"].shape[0] // batch_size),
+            )
+            if indices.shape[0] >= batch_size
+        ]
+        if not self.batches:
+            raise ValueError(f"All shards hold fewer than {batch_size} data sets")
+        self.rng.shuffle(self.batches)
+        self.batch_size = batch_size
+
+    def __call__(self, batch_size: int) -> dict:
+        if batch_size != self.batch_size or not self.batches:
+            self._new_pass(batch_size)
+
+        shard_idx, indices = self.batches.pop()
+        indices = indices[:batch_size]
+        shard = self.shards[shard_idx]
+        return {
+            "prior_non_batchable_context": None,
+            "prior_batchable_context": None,
+            "prior_draws": np.asarray(shard["prior_draws"][indices]),
+            "sim_non_batchable_context": self.num_obs[shard_idx],
+            "sim_batchable_context": None,
+            "sim_data": np.asarray(shard["sim_data"][indices]),
+        }
@@ -1,66 +1,141 @@
 import importlib
+from functools import lru_cache, partial
 
 import numpy as np
 
+from . import instrumentation, kernel, lockstep
+from .configure import Configurator, configurator
 
-def get_prior(model_name: str) -> callable:
+
+@lru_cache
+def get_model_module(model_name: str):
+    """
+    Returns the module of the specified model, imported once per process.
+    """
+    return importlib.import_module(f".{model_name}", package="src.ddm")
+
+
+def get_prior(model_name: str, rng: np.random.Generator = None) -> callable:
     """
-    Returns the prior function for the specified model.
+    Returns the prior function for the specified model, drawing from rng if given.
     """
-    module = importlib.import_module(f".{model_name}", package="src.ddm")
-    return module.prior
+    prior = get_model_module(model_name).prior
+    if rng is None:
+        return prior
+    return partial(prior, rng=rng)
 
 
-def get_batch_simulator(model_name: str) -> callable:
+def get_simulator_settings(model_name: str) -> dict:
+    """
+    Returns the simulator variant (step size, boundary shape, N200 link and
+    contamination) of the specified model.
+    """
+    module = get_model_module(model_name)
+    return dict(
+        dt=module.DT,
+        boundary_kind=module.BOUNDARY,
+        n200_link=module.N200_LINK,
+        contamination=module.CONTAMINATION,
+    )
+
+
+def get_batch_simulator(
+    model_name: str,
+    parallel: bool = False,
+    backend: str = "euler",
+    rng: np.random.Generator = None,
+    **kwargs,
+) -> callable:
     """
     Returns the batch simulator function for the specified model.
+    If parallel is True, the data sets of a batch are simulated on all numba threads.
+
+    backend selects the simulation engine: 'euler' runs the compiled per-trial
+    Euler-Maruyama kernel, 'lockstep' advances all trials of a batch as NumPy arrays,
+    'exact' samples exact first-passage times (m1a, m2, m3 and m4b only) and
+    'adaptive' takes adaptive steps with Brownian bridge crossing checks, which is
+    only faster than 'euler' for small dt or loose tolerance (see
+    src.ddm.adaptive.adaptive_path). Further keyword arguments (e.g. tolerance,
+    max_steps, censoring) are passed on to the simulator.
+
+    If rng is given, the simulator draws from it (see src.ddm.streams); the compiled
+    backends derive one seed per data set from it.
+    """
+    if rng is not None:
+        kwargs["rng"] = rng
+    settings = get_simulator_settings(model_name)
+    if backend in kernel.METHODS:
+        # fail early on invalid settings
+        kernel.make_options(
+            method=backend,
+            **settings,
+            **{k: v for k, v in kwargs.items() if k in kernel.KernelOptions._fields},
+        )
+        return partial(
+            kernel.batch_simulator,
+            parallel=parallel,
+            method=backend,
+            **settings,
+            **kwargs,
+        )
+    if parallel:
+        raise ValueError(
+            "Parallel simulation is not available for the lockstep backend"
+        )
+    if backend == "lockstep":
+        return partial(lockstep.batch_simulator, **settings, **kwargs)
+    raise ValueError(f"Unknown simulator backend: {backend}")
+
+
+def get_instrumented_simulator(
+    model_name: str,
+    parallel: bool = False,
+    backend: str = "euler",
+    rng: np.random.Generator = None,
+    **kwargs,
+) -> instrumentation.InstrumentedSimulator:
+    """
+    Returns the batch simulator of get_batch_simulator wrapped to record per-batch
+    step statistics and wall times (compiled backends only).
     """
-    module = importlib.import_module(f".{model_name}", package="src.ddm")
-    return module.batch_simulator
+    if backend not in kernel.METHODS:
+        raise ValueError(f"Step counts are not available for the {backend} backend")
+    return instrumentation.InstrumentedSimulator(
+        get_batch_simulator(
+            model_name, parallel=parallel, backend=backend, rng=rng, **kwargs
+        )
+    )
+
+
+# Shared stream of the context functions when no rng is given, instead of a new
+# Generator per call
+_context_rng = np.random.default_rng()
 
 
-def random_num_obs(num_obs_min: int = 200, num_obs_max: int = 700) -> int:
+def random_num_obs(
+    num_obs_min: int = 200, num_obs_max: int = 700, rng: np.random.Generator = None
+) -> int:
     """
     Returns a random number of observations between num_obs_min and num_obs_max.
     """
-    n_obs = np.random.default_rng().integers(num_obs_min, num_obs_max + 1)
+    if rng is None:
+        rng = _context_rng
+    n_obs = rng.integers(num_obs_min, num_obs_max + 1)
     return n_obs
 
 
-def random_num_obs_mixture(num_obs_target: int = 288) -> int:
+def random_num_obs_mixture(
+    num_obs_target: int = 288, rng: np.random.Generator = None
+) -> int:
     """
     Returns a random number of observations with a mixture distribution with modes
     num_obs_target and 2*num_obs_target.
     """
+    if rng is None:
+        rng = _context_rng
 
-    if np.random.default_rng().integers(0, 2) == 0:
-        n_obs = np.random.default_rng().normal(loc=num_obs_target, scale=10)
+    if rng.integers(0, 2) == 0:
+        n_obs = rng.normal(loc=num_obs_target, scale=10)
     else:
-        n_obs = np.random.default_rng().normal(loc=2 * num_obs_target, scale=10)
+        n_obs = rng.normal(loc=2 * num_obs_target, scale=10)
     return int(n_obs)
-
-
-def configurator(forward_dict: dict) -> dict:
-    out_dict = {}
-    data = forward_dict["sim_data"].astype(np.float32)
-
-    num_obs = forward_dict["sim_non_batchable_context"]
-    vec_num_obs = np.ones((data.shape[0], 1)) * np.log(num_obs)  # transformed num_obs
-    out_dict["direct_conditions"] = vec_num_obs.astype(np.float32)
-
-    out_dict["parameters"] = forward_dict["prior_draws"].astype(np.float32)
-
-    rt_signed = data[..., 0]
-    cpp = data[..., 1]
-
-    # recode RT as absolute_rt + response
-    response = np.zeros_like(rt_signed, dtype=np.float32)
-    response[rt_signed > 0] = 1.0
-
-    rt_abs = np.abs(rt_signed)
-
-    data_out = np.stack([rt_abs, response, cpp], axis=-1)
-
-    out_dict["summary_conditions"] = data_out
-
-    return out_dict
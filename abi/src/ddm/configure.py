@@ -0,0 +1,74 @@
+import math
+
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True)
+def fused_summary(data, out):
+    """
+    Writes the summary network input [rt_abs, response, cpp] of the simulated data
+    [rt_signed, cpp] into out, in one pass over the data.
+    """
+
+    for i in range(data.shape[0]):
+        for j in range(data.shape[1]):
+            rt_signed = np.float32(data[i, j, 0])
+            out[i, j, 0] = abs(rt_signed)
+            out[i, j, 1] = 1.0 if rt_signed > 0 else 0.0
+            out[i, j, 2] = data[i, j, 1]
+
+
+class Configurator:
+    """
+    Configurator for the amortizer, see configurator.
+
+    If views is True, the outputs are views into a float32 buffer that is reused,
+    and overwritten, by the next call, and float32 prior draws are passed on
+    without a copy. Use this when every batch is consumed before the next one is
+    configured, as in the training loop. Otherwise fresh arrays are returned.
+
+    Data simulated in the 'network' layout (see src.ddm.kernel.batch_simulator)
+    is already in the summary network layout and is passed on as is.
+    """
+
+    def __init__(self, views=False):
+        self.views = views
+        self.buffer = np.empty(0, dtype=np.float32)
+
+    def _output(self, shape):
+        if not self.views:
+            return np.empty(shape, dtype=np.float32)
+        size = math.prod(shape)
+        if self.buffer.shape[0] < size:
+            self.buffer = np.empty(size, dtype=np.float32)
+        return self.buffer[:size].reshape(shape)
+
+    def __call__(self, forward_dict: dict) -> dict:
+        data = forward_dict["sim_data"]
+        num_obs = forward_dict["sim_non_batchable_context"]
+        prior_draws = forward_dict["prior_draws"]
+
+        if data.shape[-1] == 3:
+            summary_conditions = np.asarray(data, dtype=np.float32)
+        else:
+            summary_conditions = self._output(data.shape[:2] + (3,))
+            fused_summary(data, summary_conditions)
+
+        if self.views:
+            parameters = np.asarray(prior_draws, dtype=np.float32)
+        else:
+            parameters = prior_draws.astype(np.float32)
+
+        return {
+            # transformed num_obs
+            "direct_conditions": np.full(
+                (data.shape[0], 1), np.log(num_obs), dtype=np.float32
+            ),
+            "parameters": parameters,
+            "summary_conditions": summary_conditions,
+        }
+
+
+# recode RT as absolute_rt + response, and num_obs as log(num_obs)
+configurator = Configurator()
@@ -0,0 +1,141 @@
+import math
+
+import numpy as np
+from numba import njit
+
+# Truncation point of the alternating series sampler
+# (Devroye, 2009; Polson, Scott & Windle, 2013)
+TRUNC = 0.64
+
+
+@njit(cache=True)
+def series_term(n, x):
+    """
+    Returns the n-th term a_n(x) of the alternating series of the density of the
+    exit time of a standard Brownian motion from (-1, 1).
+    """
+
+    k = (n + 0.5) * np.pi
+    if x > TRUNC:
+        return k * np.exp(-0.5 * k * k * x)
+    if x > 0:
+        return np.exp(
+            -1.5 * (np.log(0.5 * np.pi) + np.log(x))
+            + np.log(k)
+            - 2.0 * (n + 0.5) ** 2 / x
+        )
+    return 0.0
+
+
+@njit(cache=True)
+def log_norm_cdf(x):
+    return np.log(0.5 * math.erfc(-x / np.sqrt(2.0)))
+
+
+@njit(cache=True)
+def mass_exponential(z):
+    """Returns the probability of proposing from the exponential tail (x > TRUNC)."""
+
+    fz = 0.125 * np.pi**2 + 0.5 * z * z
+    b = np.sqrt(1.0 / TRUNC) * (TRUNC * z - 1)
+    a = -np.sqrt(1.0 / TRUNC) * (TRUNC * z + 1)
+
+    x0 = np.log(fz) + fz * TRUNC
+    xb = x0 - z + log_norm_cdf(b)
+    xa = x0 + z + log_norm_cdf(a)
+
+    q_over_p = 4 / np.pi * (np.exp(xb) + np.exp(xa))
+    return 1.0 / (1.0 + q_over_p)
+
+
+@njit(cache=True)
+def truncated_inverse_gaussian(z):
+    """Samples from IG(1 / z, 1) truncated to (0, TRUNC)."""
+
+    x = TRUNC + 1.0
+    if 1.0 / TRUNC > z:
+        # mean beyond the truncation point: truncated Levy proposal
+        alpha = 0.0
+        while np.random.uniform(0, 1) > alpha:
+            e1 = np.random.exponential()
+            e2 = np.random.exponential()
+            while e1 * e1 > 2 * e2 / TRUNC:
+                e1 = np.random.exponential()
+                e2 = np.random.exponential()
+            x = 1 + e1 * TRUNC
+            x = TRUNC / (x * x)
+            alpha = np.exp(-0.5 * z * z * x)
+    else:
+        mu = 1.0 / z
+        while x > TRUNC:
+            y = np.random.normal() ** 2
+            mu_y = mu * y
+            x = mu + 0.5 * mu * mu_y - 0.5 * mu * np.sqrt(4 * mu_y + mu_y * mu_y)
+            if np.random.uniform(0, 1) > mu / (mu + x):
+                x = mu * mu / x
+    return x
+
+
+@njit(cache=True)
+def exit_time(z):
+    """
+    Samples the time a Brownian motion with drift z, started at 0, needs to leave
+    (-1, 1). This is the J*(1, z) distribution, sampled exactly with the
+    alternating series method.
+    """
+
+    z = abs(z)
+    fz = 0.125 * np.pi**2 + 0.5 * z * z
+    while True:
+        if np.random.uniform(0, 1) < mass_exponential(z):
+            x = TRUNC + np.random.exponential() / fz
+        else:
+            x = truncated_inverse_gaussian(z)
+
+        s = series_term(0, x)
+        y = np.random.uniform(0, 1) * s
+        n = 0
+        while True:
+            n += 1
+            if n % 2 == 1:
+                s -= series_term(n, x)
+                if y <= s:
+                    return x
+            else:
+                s += series_term(n, x)
+                if y > s:
+                    break
+
+
+@njit(cache=True)
+def first_passage(drift, boundary, beta):
+    """
+    Samples the decision time and choice of a Wiener process with unit diffusion,
+    constant bounds 0 and boundary, and start point beta * boundary, without
+    discretisation error. Also returns the number of jumps.
+
+    From the current point x, the path is followed to the exit of the largest
+    interval (x - r, x + r) inside the bounds. For an interval centred on the
+    start point, the exit time is independent of the exit side, so both can be
+    sampled separately. One side of the interval is always a bound, so the walk
+    ends after a few jumps on average.
+    """
+
+    x = boundary * beta
+    t = 0.0
+    n_jumps = 0
+    while True:
+        n_jumps += 1
+        r = min(x, boundary - x)
+        c = drift * r
+        t += r * r * exit_time(c)
+
+        # exit through x + r with probability 1 / (1 + exp(-2 * drift * r))
+        if np.random.uniform(0, 1) * (1.0 + np.exp(-2.0 * c)) < 1.0:
+            if r >= boundary - x:
+                return t, True, n_jumps
+            x += r
+        else:
+            if r >= x:
+                return t, False, n_jumps
+            x -= r
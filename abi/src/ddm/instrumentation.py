@@ -0,0 +1,95 @@
+import time
+
+import numpy as np
+
+# Share of the slowest trials whose cost is reported by summarize_steps
+TAIL_QUANTILE = 0.99
+
+
+def summarize_steps(
+    n_steps: np.ndarray, censored: np.ndarray, resamples: np.ndarray
+) -> dict:
+    """
+    Summarizes the per-trial step counts, censored flags and numbers of resampled
+    paths of a simulated batch (see src.ddm.kernel.diffusion_trial).
+
+    The histogram has power-of-two bins: bin k counts the trials with
+    2**k <= n_steps < 2**(k+1), bin 0 also holds trials without steps. Steps are a
+    proxy for simulation time, so tail_share is the fraction of the batch's
+    simulation time spent in its slowest 1% of trials. censored is the fraction of
+    trials whose decision was censored (clamped or marked), resampled the fraction
+    of trials that needed more than one path.
+    """
+
+    n_steps = np.ravel(n_steps)
+    total = n_steps.sum()
+    n_tail = max(1, int(np.ceil((1 - TAIL_QUANTILE) * n_steps.size)))
+    tail = np.partition(n_steps, n_steps.size - n_tail)[-n_tail:]
+
+    bins = np.floor(np.log2(np.maximum(n_steps, 1))).astype(np.int64)
+    return dict(
+        n_trials=n_steps.size,
+        total_steps=int(total),
+        mean_steps=float(n_steps.mean()),
+        max_steps=int(n_steps.max()),
+        tail_share=float(tail.sum() / total) if total > 0 else 0.0,
+        censored=float(np.mean(censored)),
+        resampled=float(np.mean(np.ravel(resamples) > 0)),
+        histogram=np.bincount(bins),
+    )
+
+
+class InstrumentedSimulator:
+    """
+    Wraps a compiled batch simulator (see src.ddm.kernel.batch_simulator) and
+    records the step statistics and wall time of every simulated batch.
+    """
+
+    def __init__(self, batch_simulator: callable):
+        self.batch_simulator = batch_simulator
+        self.batches = []
+
+    def __call__(self, prior_samples, n_obs):
+        start = time.perf_counter()
+        sim_data, n_steps, censored, resamples = self.batch_simulator(
+            prior_samples, n_obs, return_steps=True
+        )
+        stats = summarize_steps(n_steps, censored, resamples)
+        stats["wall_time"] = time.perf_counter() - start
+        self.batches.append(stats)
+        return sim_data
+
+    def report(self) -> str:
+        """Returns a text summary of all batches simulated so far."""
+
+        if not self.batches:
+            return "No batches simulated"
+
+        wall_time = np.array([b["wall_time"] for b in self.batches])
+        max_steps = np.array([b["max_steps"] for b in self.batches])
+        tail_share = np.array([b["tail_share"] for b in self.batches])
+        censored = np.array([b["censored"] for b in self.batches])
+        resampled = np.array([b["resampled"] for b in self.batches])
+        n_bins = max(b["histogram"].size for b in self.batches)
+        histogram = sum(
+            np.pad(b["histogram"], (0, n_bins - b["histogram"].size))
+            for b in self.batches
+        )
+
+        lines = [
+            f"batches: {len(self.batches)}, "
+            f"trials: {sum(b['n_trials'] for b in self.batches)}",
+            f"wall time per batch: mean {wall_time.mean():.4f}s, "
+            f"p99 {np.quantile(wall_time, 0.99):.4f}s, max {wall_time.max():.4f}s",
+            f"max steps per batch: median {np.median(max_steps):.0f}, "
+            f"max {max_steps.max()}",
+            f"share of steps in slowest 1% of trials: mean {tail_share.mean():.3f}, "
+            f"max {tail_share.max():.3f}",
+            f"censored trials: {censored.mean():.4%}",
+            f"resampled trials: {resampled.mean():.4%}",
+            "steps histogram:",
+        ]
+        for k, count in enumerate(histogram):
+            if count > 0:
+                lines.append(f"  [{2**k}, {2**(k + 1)}): {count}")
+        return "\n".join(lines)
@@ -0,0 +1,438 @@
+import threading
+from collections import namedtuple
+
+import numpy as np
+from numba import njit, parallel_chunksize, prange
+
+from .adaptive import adaptive_path
+from .bounds import BOUNDARY_KINDS, CONSTANT, collapse
+from .exact import first_passage
+from .streams import dataset_seeds
+
+# N200 links
+IDENTITY = 0
+GAMMA = 1  # m2: N200 ~ N(gamma * tau_e, sigma)
+
+# Contamination kinds
+NONE = 0
+UNIFORM_LAPSE = 1  # m3: RT*ACC ~ (1-theta)*DDM + theta*U(-maxrt,maxrt)
+N200_MIXTURE = 2  # m4b: N200 and encoding time from the population w.p. theta
+
+# Simulation methods for the decision process
+EULER = 0  # Euler-Maruyama steps of size dt
+EXACT = 1  # exact first-passage times, constant bounds only
+ADAPTIVE = 2  # adaptive steps with Brownian bridge crossing checks
+
+N200_LINKS = {"identity": IDENTITY, "gamma": GAMMA}
+CONTAMINATION_KINDS = {
+    None: NONE,
+    "uniform_lapse": UNIFORM_LAPSE,
+    "n200_mixture": N200_MIXTURE,
+}
+
+# Censoring policies for paths that exhaust the step budget
+MARK = 0  # the signed RT is set to NaN
+RESAMPLE = 1  # the path is simulated again, up to MAX_RESAMPLES times
+CLAMP = 2  # the decision is taken at the budget, for the nearer bound
+
+# Attempts per trial under the resample policy, after which the trial is clamped
+MAX_RESAMPLES = 100
+
+METHODS = {"euler": EULER, "exact": EXACT, "adaptive": ADAPTIVE}
+CENSORING = {"mark": MARK, "resample": RESAMPLE, "clamp": CLAMP}
+
+# Settings of the compiled kernels, see make_options
+KernelOptions = namedtuple(
+    "KernelOptions",
+    [
+        "boundary_kind",
+        "n200_link",
+        "contamination",
+        "method",
+        "dt",
+        "tolerance",
+        "max_steps",
+        "censoring",
+    ],
+)
+
+
+def make_options(
+    dt,
+    boundary_kind,
+    n200_link,
+    contamination,
+    method="euler",
+    tolerance=1e-5,
+    max_steps=0,
+    censoring="clamp",
+):
+    """
+    Translates the simulator settings of a model into KernelOptions.
+
+    tolerance is the accuracy knob of the adaptive method: crossing probabilities
+    below it are neglected. max_steps is the per-trial step budget of the euler and
+    adaptive methods (0 for none), and censoring the policy for paths that exhaust
+    it: 'mark', 'resample' or 'clamp'.
+    """
+
+    if method == "exact" and boundary_kind != "constant":
+        raise ValueError("Exact first-passage times require constant bounds")
+
+    return KernelOptions(
+        boundary_kind=BOUNDARY_KINDS[boundary_kind],
+        n200_link=N200_LINKS[n200_link],
+        contamination=CONTAMINATION_KINDS[contamination],
+        method=METHODS[method],
+        dt=float(dt),
+        tolerance=float(tolerance),
+        max_steps=int(max_steps),
+        censoring=CENSORING[censoring],
+    )
+
+
+# Initial length of the boundary schedule of a data set, in steps
+SCHEDULE_LENGTH = 1024
+
+
+@njit(cache=True)
+def boundary_schedule(boundary, extra, boundary_kind, dt, n_steps_max):
+    """
+    Returns the lower bound after 0, 1, ..., n steps of size dt, where n is the step
+    at which the bounds meet (no path survives it) or n_steps_max, whichever comes
+    first. The upper bound is boundary minus the lower bound.
+    """
+
+    schedule = np.empty(n_steps_max + 1)
+    for n in range(n_steps_max + 1):
+        lower = collapse(float(n), dt, boundary, extra, boundary_kind)
+        schedule[n] = lower
+        if lower >= boundary - lower:
+            return schedule[: n + 1]
+    return schedule
+
+
+@njit(cache=True)
+def euler_path(drift, boundary, beta, extra, boundary_kind, dt, schedule, max_steps):
+    """
+    Simulates the decision time and choice of a single DM path. Also returns the
+    number of steps taken and whether the path was censored, i.e. stopped after
+    max_steps steps (0 for no limit) before hitting a bound. A censored path is
+    assigned the nearer bound.
+
+    For time-varying bounds the lower bound is read from the precomputed schedule
+    (see boundary_schedule), and only computed on the fly beyond its end.
+    """
+
+    step_limit = max_steps if max_steps > 0 else np.iinfo(np.int64).max
+    n_steps = 0
+    evidence = boundary * beta
+    lower = 0.0
+    upper = boundary
+
+    while evidence > lower and evidence < upper and n_steps < step_limit:
+        # DDM equation
+        evidence += drift * dt + np.sqrt(dt) * np.random.normal()
+
+        # Increment step
+        n_steps += 1
+
+        if boundary_kind != CONSTANT:
+            if n_steps < schedule.shape[0]:
+                lower = schedule[n_steps]
+            else:
+                lower = collapse(float(n_steps), dt, boundary, extra, boundary_kind)
+            upper = boundary - lower
+
+    censored = evidence > lower and evidence < upper
+    if censored:
+        return float(n_steps) * dt, evidence >= 0.5 * (lower + upper), n_steps, True
+    return float(n_steps) * dt, evidence >= upper, n_steps, False
+
+
+@njit(cache=True)
+def diffusion_trial(params, options, schedule):
+    """
+    Simulates a trial from the diffusion model. Returns the signed RT, the N200
+    latency, the number of steps of the decision process, summed over all
+    attempts if censored paths were resampled, the most steps of a single path,
+    whether the returned decision is censored (clamped or marked), and the
+    number of censored paths that were resampled.
+    """
+
+    drift = params[0]
+    boundary = params[1]
+    beta = params[2]
+    mu_tau_e = params[3]
+    tau_m = params[4]
+    sigma = params[5]
+    varsigma = params[6]
+    # gamma (m2), theta (m3, m4b), a_slope (m5) or lambda (m6)
+    extra = params[7] if params.shape[0] > 7 else 0.0
+
+    total_steps = 0
+    path_steps = 0
+    for attempt in range(MAX_RESAMPLES):
+        if options.method == EXACT:
+            rt, upper_hit, n_steps = first_passage(drift, boundary, beta)
+            censored = False
+        elif options.method == ADAPTIVE:
+            rt, upper_hit, n_steps, censored = adaptive_path(
+                drift,
+                boundary,
+                beta,
+                extra,
+                options.boundary_kind,
+                options.dt,
+                options.tolerance,
+                options.max_steps,
+            )
+        else:
+            rt, upper_hit, n_steps, censored = euler_path(
+                drift,
+                boundary,
+                beta,
+                extra,
+                options.boundary_kind,
+                options.dt,
+                schedule,
+                options.max_steps,
+            )
+        total_steps += n_steps
+        path_steps = max(path_steps, n_steps)
+        if not censored or options.censoring != RESAMPLE:
+            break
+
+    # visual encoding time for each trial
+    tau_e_trial = np.random.normal(mu_tau_e, varsigma)
+
+    # N200 latency
+    if options.n200_link == GAMMA:
+        z = np.random.normal(extra * tau_e_trial, sigma)
+    else:
+        z = np.random.normal(tau_e_trial, sigma)
+
+    if options.contamination == N200_MIXTURE:
+        z_contaminated = np.random.normal(mu_tau_e, np.sqrt(sigma**2 + varsigma**2))
+        if np.random.uniform(0, 1) > 1 - extra:
+            z = z_contaminated
+            tau_e_trial = mu_tau_e
+
+    if upper_hit:
+        choicert = tau_e_trial + rt + tau_m
+    else:
+        choicert = -tau_e_trial - rt - tau_m
+
+    if options.contamination == UNIFORM_LAPSE:
+        # lapse distribution U(-maxrt, maxrt)
+        uniform_choicert = np.random.uniform(-5, 5)
+        if np.random.uniform(0, 1) > 1 - extra:
+            choicert = uniform_choicert
+
+    if censored and options.censoring == MARK:
+        choicert = np.nan
+
+    return choicert, z, total_steps, path_steps, censored, attempt
+
+
+@njit(cache=True)
+def diffusion_condition(params, n_trials, options, seed=-1):
+    """
+    Simulates a diffusion process over an entire condition. Also returns the
+    number of steps, the censored flag and the number of resampled paths of each
+    trial (see diffusion_trial).
+
+    If seed is non-negative, numba's RNG of the calling thread is reseeded with it
+    first, so the data set does not depend on which thread simulates it.
+    """
+
+    if seed >= 0:
+        np.random.seed(seed)
+
+    # The bounds of time-varying boundary models are tabulated once per data set
+    # and shared by all its trials. The table grows when trials outlast it.
+    scheduled = options.method == EULER and options.boundary_kind != CONSTANT
+    extra = params[7] if params.shape[0] > 7 else 0.0
+    schedule = np.zeros(1)
+    if scheduled:
+        schedule = boundary_schedule(
+            params[1], extra, options.boundary_kind, options.dt, SCHEDULE_LENGTH
+        )
+
+    choicert = np.empty(n_trials)
+    z = np.empty(n_trials)
+    n_steps = np.empty(n_trials, dtype=np.int64)
+    censored = np.empty(n_trials, dtype=np.bool_)
+    resamples = np.empty(n_trials, dtype=np.int64)
+    for i in range(n_trials):
+        choicert[i], z[i], n_steps[i], path_steps, censored[i], resamples[i] = (
+            diffusion_trial(params, options, schedule)
+        )
+        # resampled trials sum the steps of several paths, each within the table
+        if scheduled and path_steps >= schedule.shape[0]:
+            schedule = boundary_schedule(
+                params[1], extra, options.boundary_kind, options.dt, 2 * path_steps
+            )
+    return choicert, z, n_steps, censored, resamples
+
+
+# Output layouts of the simulators
+LAYOUTS = {"signed": 2, "network": 3}
+
+
+@njit(cache=True)
+def write_condition(out, choicert, z):
+    """
+    Writes the trials of a condition into out, as [rt_signed, n200] if out has two
+    columns, or in the layout of the summary network input, [rt_abs, response,
+    n200], if it has three (see src.ddm.configure).
+    """
+
+    for j in range(choicert.shape[0]):
+        rt_signed = np.float32(choicert[j])
+        if out.shape[1] == 2:
+            out[j, 0] = rt_signed
+            out[j, 1] = z[j]
+        else:
+            out[j, 0] = abs(rt_signed)
+            out[j, 1] = 1.0 if rt_signed > 0 else 0.0
+            out[j, 2] = z[j]
+
+
+@njit(parallel=True, cache=True)
+def batch_simulator_parallel(
+    prior_samples,
+    n_obs,
+    options,
+    seeds,
+    sim_data,
+    sim_steps,
+    sim_censored,
+    sim_resamples,
+):
+    """
+    Simulates multiple data sets into sim_data, and the per-trial step counts,
+    censored flags and numbers of resampled paths into sim_steps, sim_censored and
+    sim_resamples, one data set per parallel iteration. seeds holds one seed per data
+    set, or is empty to continue the threads' RNG states.
+    """
+
+    for i in prange(prior_samples.shape[0]):
+        seed = seeds[i] if seeds.shape[0] > 0 else -1
+        choicert, z, n_steps, censored, resamples = diffusion_condition(
+            prior_samples[i], n_obs, options, seed
+        )
+        write_condition(sim_data[i], choicert, z)
+        sim_steps[i] = n_steps
+        sim_censored[i] = censored
+        sim_resamples[i] = resamples
+
+
+def batch_simulator(
+    prior_samples,
+    n_obs,
+    dt,
+    boundary_kind,
+    n200_link,
+    contamination,
+    parallel=False,
+    method="euler",
+    tolerance=1e-5,
+    max_steps=0,
+    censoring="clamp",
+    return_steps=False,
+    rng=None,
+    layout="signed",
+):
+    """
+    Simulate multiple diffusion_model_datasets.
+
+    The model variant is given by the DT, BOUNDARY, N200_LINK and CONTAMINATION
+    settings of the model module. If parallel is True, the data sets are
+    distributed over all numba threads. method is 'euler' (steps of size dt),
+    'exact' (exact first-passage times, constant bounds only) or 'adaptive'
+    (adaptive steps down to dt, with crossing probabilities below tolerance
+    neglected). See make_options for the step budget max_steps and the censoring
+    policy. If return_steps is True, the (n_sim, n_obs) step counts, censored flags
+    and numbers of resampled paths of the trials are returned as well.
+
+    If rng (a np.random.Generator) is given, every data set is simulated from its
+    own seed drawn from rng, which makes the output reproducible and independent
+    of the number of threads. Otherwise numba's global RNG state is used.
+
+    layout 'signed' returns (n_sim, n_obs, 2) float32 data [rt_signed, n200], with
+    negative RTs for lower bound hits. layout 'network' returns (n_sim, n_obs, 3)
+    data [rt_abs, response, n200], the summary network input of the configurator.
+    """
+
+    options = make_options(
+        dt,
+        boundary_kind,
+        n200_link,
+        contamination,
+        method,
+        tolerance,
+        max_steps,
+        censoring,
+    )
+
+    n_sim = prior_samples.shape[0]
+    sim_data = np.empty((n_sim, n_obs, LAYOUTS[layout]), dtype=np.float32)
+    if rng is None:
+        seeds = np.empty(0, dtype=np.int64)
+    else:
+        seeds = dataset_seeds(rng, n_sim)
+
+    sim_steps = np.empty((n_sim, n_obs), dtype=np.int64)
+    sim_censored = np.empty((n_sim, n_obs), dtype=np.bool_)
+    sim_resamples = np.empty((n_sim, n_obs), dtype=np.int64)
+
+    if parallel:
+        # Hand out one data set at a time, so that slow data sets (small drift,
+        # wide boundary) do not leave the remaining threads idle.
+        with parallel_chunksize(1):
+            batch_simulator_parallel(
+                prior_samples,
+                n_obs,
+                options,
+                seeds,
+                sim_data,
+                sim_steps,
+                sim_censored,
+                sim_resamples,
+            )
+    else:
+        # Simulate diffusion data
+        for i in range(n_sim):
+            seed = seeds[i] if rng is not None else -1
+            choicert, z, sim_steps[i], sim_censored[i], sim_resamples[i] = (
+                diffusion_condition(prior_samples[i], n_obs, options, seed)
+            )
+            write_condition(sim_data[i], choicert, z)
+
+    if return_steps:
+        return sim_data, sim_steps, sim_censored, sim_resamples
+    return sim_data
+
+
+def warm_up(parallel=False, background=False):
+    """
+    Compiles the simulation kernels, or loads them from the on-disk cache, so that
+    the first simulated batch does not pay for JIT compilation. All model variants
+    and simulation methods share one compiled specialisation, hence a single call
+    covers m1a ... m6.
+
+    If background is True, the work is done in a daemon thread, which is returned.
+    """
+
+    if background:
+        thread = threading.Thread(
+            target=warm_up, kwargs=dict(parallel=parallel), daemon=True
+        )
+        thread.start()
+        return thread
+
+    params = np.array([[1.0, 1.0, 0.5, 0.1, 0.1, 0.1, 0.1, 0.5]], dtype=np.float32)
+    batch_simulator(params, 1, 0.005, "constant", "identity", None)
+    if parallel:
+        batch_simulator(params, 1, 0.005, "constant", "identity", None, parallel=True)
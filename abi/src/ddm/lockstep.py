@@ -0,0 +1,152 @@
+import numpy as np
+
+from .bounds import WEIBULL_SHAPE
+
+
+def boundaries(t, boundary, extra, boundary_kind):
+    """
+    Returns the lower and upper boundary at time t for each path.
+    ----------
+
+    Arguments:
+    t             : float -- the elapsed decision time, shared by all paths
+    boundary      : np.ndarray of shape (n_paths,) -- the initial boundary separation
+    extra         : np.ndarray of shape (n_paths,) or None -- the collapse parameter
+    boundary_kind : str -- one of 'constant', 'linear' (m5) or 'weibull' (m6)
+    """
+
+    if boundary_kind == "constant":
+        return 0.0, boundary
+    if boundary_kind == "linear":
+        collapse = extra * t
+    elif boundary_kind == "weibull":
+        collapse = (1 - np.exp(-((t / extra) ** WEIBULL_SHAPE))) * 0.5 * boundary
+    else:
+        raise ValueError(f"Unknown boundary kind: {boundary_kind}")
+    return collapse, boundary - collapse
+
+
+def simulate_decisions(
+    drift, boundary, beta, extra, boundary_kind, dt, block_size, rng
+):
+    """
+    Simulates many independent evidence paths in lock-step.
+
+    All paths advance one Euler-Maruyama step at a time as arrays. Gaussian
+    increments are drawn for block_size steps at once, and paths that have hit
+    a boundary are dropped from the working arrays at the end of each block.
+    ----------
+
+    Output:
+    rt        : np.ndarray of shape (n_paths,) -- the decision times
+    upper_hit : np.ndarray of shape (n_paths,) -- True where the upper boundary was hit
+    """
+
+    n_paths = drift.shape[0]
+    rt = np.empty(n_paths)
+    upper_hit = np.empty(n_paths, dtype=bool)
+
+    active = np.arange(n_paths)
+    evidence = boundary * beta
+    drift_dt = drift * dt
+    sqrt_dt = np.sqrt(dt)
+    n_steps = 0
+
+    while active.size > 0:
+        noise = rng.standard_normal((block_size, active.size))
+        noise *= sqrt_dt
+        alive = np.ones(active.size, dtype=bool)
+
+        for k in range(block_size):
+            # Finished paths keep moving until the next compaction, but are masked
+            # out below, which is cheaper than masking the update itself.
+            evidence += drift_dt
+            evidence += noise[k]
+            n_steps += 1
+
+            lower, upper = boundaries(n_steps * dt, boundary, extra, boundary_kind)
+            is_upper = alive & (evidence >= upper)
+            is_hit = is_upper | (alive & (evidence <= lower))
+            if is_hit.any():
+                rt[active[is_hit]] = n_steps * dt
+                upper_hit[active[is_hit]] = is_upper[is_hit]
+                alive &= ~is_hit
+                if not alive.any():
+                    break
+
+        # Compact the survivors
+        active = active[alive]
+        evidence = evidence[alive]
+        drift_dt = drift_dt[alive]
+        boundary = boundary[alive]
+        if extra is not None:
+            extra = extra[alive]
+
+    return rt, upper_hit
+
+
+def batch_simulator(
+    prior_samples,
+    n_obs,
+    dt,
+    boundary_kind,
+    n200_link,
+    contamination,
+    block_size=100,
+    rng=None,
+    layout="signed",
+):
+    """
+    Simulate multiple diffusion_model_datasets with the lock-step engine.
+
+    Produces the same (n_sim, n_obs, 2) layout of signed RTs and N200 latencies
+    as the compiled kernel.batch_simulator, or its (n_sim, n_obs, 3) 'network'
+    layout. The model variant is given by the DT, BOUNDARY, N200_LINK and
+    CONTAMINATION settings of the model module.
+    """
+
+    if rng is None:
+        rng = np.random.default_rng()
+
+    n_sim = prior_samples.shape[0]
+    params = np.repeat(np.asarray(prior_samples, dtype=np.float64), n_obs, axis=0)
+    drift, boundary, beta, mu_tau_e, tau_m, sigma, varsigma = params[:, :7].T
+    extra = params[:, 7] if params.shape[1] > 7 else None
+    n_paths = params.shape[0]
+
+    rt, upper_hit = simulate_decisions(
+        drift, boundary, beta, extra, boundary_kind, dt, block_size, rng
+    )
+
+    # visual encoding time for each trial
+    tau_e_trial = rng.normal(mu_tau_e, varsigma)
+
+    # N200 latency
+    if n200_link == "gamma":
+        z = rng.normal(extra * tau_e_trial, sigma)
+    else:
+        z = rng.normal(tau_e_trial, sigma)
+
+    choicert = tau_e_trial + rt + tau_m
+
+    if contamination == "n200_mixture":
+        # N200 and encoding time replaced by the population values w.p. theta
+        contaminated = rng.uniform(0, 1, size=n_paths) > 1 - extra
+        z_contaminated = rng.normal(mu_tau_e, np.sqrt(sigma**2 + varsigma**2))
+        z[contaminated] = z_contaminated[contaminated]
+        choicert[contaminated] = (mu_tau_e + rt + tau_m)[contaminated]
+
+    choicert[~upper_hit] *= -1
+
+    if contamination == "uniform_lapse":
+        # RT*ACC ~ (1-theta)*DDM + theta*U(-maxrt,maxrt)
+        lapse = rng.uniform(0, 1, size=n_paths) > 1 - extra
+        choicert[lapse] = rng.uniform(-5, 5, size=lapse.sum())
+
+    choicert = choicert.astype(np.float32)
+    if layout == "network":
+        columns = [np.abs(choicert), choicert > 0, z]
+    else:
+        columns = [choicert, z]
+    sim_data = np.stack(columns, axis=-1).astype(np.float32)
+    return sim_data.reshape(n_sim, n_obs, len(columns))
@@ -0,0 +1,45 @@
+import numpy as np
+
+# Independent random streams spawned from the seed of a run
+STREAMS = ("prior", "context", "simulator", "bank", "subsample")
+
+
+def make_generator(seed=None) -> np.random.Generator:
+    """
+    Returns a Generator on the counter-based Philox bit generator. seed may be an
+    int, a np.random.SeedSequence or None (fresh entropy).
+    """
+    return np.random.Generator(np.random.Philox(seed))
+
+
+def make_streams(seed=None) -> dict:
+    """
+    Returns one independent Generator per entry of STREAMS, all derived from a
+    single seed (an int, a np.random.SeedSequence or None), so that a run is
+    reproducible from that seed alone.
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    children = seed.spawn(len(STREAMS))
+    return {name: make_generator(child) for name, child in zip(STREAMS, children)}
+
+
+# numba's np.random.seed only takes the low 32 bits of a seed
+SEED_SPACE = 2**32
+
+
+def dataset_seeds(rng: np.random.Generator, n_datasets: int) -> np.ndarray:
+    """
+    Draws one seed per data set for the compiled kernels, which reseed numba's
+    RNG with it before simulating that data set.
+
+    numba seeds its Mersenne Twister from 32 bits only, so there are SEED_SPACE
+    distinct data set streams. The seeds of one call are drawn without
+    replacement and hence never repeat within a batch, but independent calls
+    collide by the birthday bound: among N data sets about N**2 / 2**33 pairs
+    share their simulation noise (one pair among 93,000 data sets, about 12,000
+    pairs among 10 million). Their parameters still differ, so such pairs
+    are not duplicates of each other.
+    """
+    assert n_datasets <= SEED_SPACE, f"{n_datasets} data sets exceed the seed space"
+    return rng.choice(SEED_SPACE, size=n_datasets, replace=False).astype(np.int64)
@@ -0,0 +1,99 @@
+import glob
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from .io_utils import atomic_save
+
+# Default location of the cache, relative to the abi directory
+CACHE_DIR = "cache/draws"
+
+
+def checkpoint_fingerprint(checkpoint_path: str) -> str:
+    """
+    Hashes the checkpoint state file and the index files of a checkpoint
+    directory. The index files hold checksums of all saved tensors, so the
+    fingerprint changes whenever the weights do.
+    """
+
+    digest = hashlib.sha256()
+    paths = [os.path.join(checkpoint_path, "checkpoint")]
+    paths += sorted(glob.glob(os.path.join(checkpoint_path, "*.index")))
+    for path in paths:
+        if os.path.exists(path):
+            digest.update(os.path.basename(path).encode())
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def array_hash(*arrays) -> str:
+    """Hashes the shapes, dtypes and contents of the given arrays."""
+
+    digest = hashlib.sha256()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.dtype.str}{array.shape}".encode())
+        digest.update(array.data)
+    return digest.hexdigest()
+
+
+class DrawCache:
+    """
+    On-disk cache of named arrays (e.g. theta_true and posterior samples), keyed
+    by a dict of everything they depend on.
+
+    Every entry is one .npz file named after the hash of its key. Reading an
+    entry marks it as recently used. After every write, the least recently used
+    entries are removed until the cache holds at most max_bytes.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = 5 * 2**30):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, key: dict) -> str:
+        name = hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.npz")
+
+    def get(self, key: dict):
+        """Returns the arrays stored under key as a dict, or None."""
+
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as entry:
+            arrays = {name: entry[name] for name in entry.files}
+        os.utime(path)
+        return arrays
+
+    def put(self, key: dict, arrays: dict):
+        path = self.path(key)
+        with atomic_save(path) as tmp_path:
+            np.savez(tmp_path, **arrays)
+        self.evict()
+
+    def evict(self):
+        entries = [
+            (os.stat(path), path)
+            for path in glob.glob(os.path.join(self.cache_dir, "*.npz"))
+            if not path.endswith(".tmp.npz")
+        ]
+        total = sum(stat.st_size for stat, _ in entries)
+        for stat, path in sorted(entries, key=lambda entry: entry[0].st_mtime):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= stat.st_size
+
+    def cached(self, key: dict, compute: callable) -> dict:
+        """Returns the arrays stored under key, computing and storing them if needed."""
+
+        arrays = self.get(key)
+        if arrays is None:
+            arrays = compute()
+            self.put(key, arrays)
+        return arrays
@@ -0,0 +1,103 @@
+import argparse
+import os
+
+import numpy as np
+
+from .io_utils import atomic_save
+
+# Default location of the on-disk cache, relative to the abi directory
+CACHE_DIR = "cache/ecdf_bands"
+
+# Calibration method, part of the cache key in case another one is added
+METHOD = "simulation"
+
+_memory_cache = {}
+
+
+def cache_key(num_samples, num_points, num_simulations, confidence, eps, max_points):
+    return (
+        int(num_samples),
+        None if num_points is None else int(num_points),
+        int(num_simulations),
+        float(confidence),
+        float(eps),
+        int(max_points),
+        METHOD,
+    )
+
+
+def cache_file(cache_dir, key):
+    num_samples, num_points, num_simulations, confidence, eps, max_points, method = key
+    return os.path.join(
+        cache_dir,
+        f"{method}_n{num_samples}_p{num_points}_s{num_simulations}"
+        f"_c{confidence}_e{eps}_m{max_points}.npz",
+    )
+
+
+def ecdf_bands(
+    num_samples,
+    num_points=None,
+    num_simulations=1000,
+    confidence=0.95,
+    eps=1e-5,
+    max_num_points=1000,
+    cache_dir=CACHE_DIR,
+):
+    """
+    Cached version of bayesflow's simultaneous_ecdf_bands, with the same arguments
+    and return values (alpha, z, L, H).
+
+    Bands are looked up in memory, then in cache_dir (None to disable the disk
+    cache), and only calibrated if missing from both. The returned arrays are
+    copies, so callers may modify them in place.
+    """
+
+    key = cache_key(
+        num_samples, num_points, num_simulations, confidence, eps, max_num_points
+    )
+
+    if key not in _memory_cache:
+        path = None if cache_dir is None else cache_file(cache_dir, key)
+        if path is not None and os.path.exists(path):
+            with np.load(path) as bands:
+                alpha, z, L, H = (bands[k] for k in ["alpha", "z", "L", "H"])
+        else:
+            # imported here, so that cached bands do not load bayesflow
+            from bayesflow.computational_utilities import simultaneous_ecdf_bands
+
+            alpha, z, L, H = simultaneous_ecdf_bands(
+                num_samples,
+                num_points=num_points,
+                num_simulations=num_simulations,
+                confidence=confidence,
+                eps=eps,
+                max_num_points=max_num_points,
+            )
+            if path is not None:
+                os.makedirs(cache_dir, exist_ok=True)
+                with atomic_save(path) as tmp_path:
+                    np.savez(tmp_path, alpha=alpha, z=z, L=L, H=H)
+        _memory_cache[key] = (float(alpha), np.asarray(z), np.asarray(L), np.asarray(H))
+
+    alpha, z, L, H = _memory_cache[key]
+    return alpha, z.copy(), L.copy(), H.copy()
+
+
+def precompute_bands(sizes, cache_dir=CACHE_DIR, **kwargs):
+    """Fills the cache with the bands for each number of samples in sizes."""
+
+    for num_samples in sizes:
+        ecdf_bands(num_samples, cache_dir=cache_dir, **kwargs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Precompute simultaneous ECDF bands for common SBC sizes."
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200])
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--cache_dir", type=str, default=CACHE_DIR)
+    args = parser.parse_args()
+
+    precompute_bands(args.sizes, cache_dir=args.cache_dir, confidence=args.confidence)
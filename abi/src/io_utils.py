@@ -0,0 +1,37 @@
+import json
+import os
+from contextlib import contextmanager
+
+INDEX_FILE = "index.json"
+
+
+@contextmanager
+def atomic_save(path: str):
+    """
+    Yields a temporary path to write the file at path to, and renames it to path
+    once the block completes, so that readers never see a partial file. The
+    temporary name holds the process id, so concurrent writers of the same file
+    do not interfere, and keeps the extension of path, so that np.save and
+    np.savez do not append theirs. The temporary file is removed on errors.
+    """
+
+    tmp_path = f"{path}.{os.getpid()}.tmp{os.path.splitext(path)[1]}"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def read_index(directory: str) -> dict:
+    with open(os.path.join(directory, INDEX_FILE)) as f:
+        return json.load(f)
+
+
+def write_index(directory: str, index: dict):
+    """Writes the index.json of a directory of shards or cached files."""
+
+    with atomic_save(os.path.join(directory, INDEX_FILE)) as tmp_path:
+        with open(tmp_path, "w") as f:
+            json.dump(index, f, indent=2)
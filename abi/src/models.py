@@ -1,4 +1,8 @@
+from collections import namedtuple
+
 import bayesflow as bf
+import tensorflow as tf
+from bayesflow.helper_classes import LossHistory
 
 
 def get_amortizer(cfg, num_params):
@@ -14,3 +18,33 @@ def get_amortizer(cfg, num_params):
     )
 
     return amortizer
+
+
+# Everything evaluation needs from a trained bf.trainers.Trainer
+InferenceModel = namedtuple(
+    "InferenceModel", ["amortizer", "configurator", "loss_history"]
+)
+
+
+def load_amortizer(cfg, num_params, checkpoint_path, configurator):
+    """
+    Restores the amortizer weights of the latest checkpoint in checkpoint_path,
+    without building a Trainer, a generative model or the optimizer state.
+
+    The returned InferenceModel can stand in for the trainer wherever only its
+    amortizer, configurator and loss history are used (eval.py, posterior SBC).
+    Weights of layers that are built lazily are restored on their first call.
+    """
+
+    latest_checkpoint = tf.train.latest_checkpoint(checkpoint_path)
+    if latest_checkpoint is None:
+        raise FileNotFoundError(f"No checkpoint found in {checkpoint_path}")
+
+    amortizer = get_amortizer(cfg, num_params)
+    # same structure as the Trainer's checkpoint; the optimizer is not saved
+    tf.train.Checkpoint(model=amortizer).restore(latest_checkpoint).expect_partial()
+
+    loss_history = LossHistory()
+    loss_history.load_from_file(checkpoint_path)
+
+    return InferenceModel(amortizer, configurator, loss_history)
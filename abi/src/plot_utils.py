@@ -1,11 +1,13 @@
 # import matplotlib.colors as mpl_colors
+import matplotlib.colors as mcolors
 import matplotlib.patches as mpatches
 import matplotlib.pyplot as plt
 import numpy as np
 import seaborn as sns
-from bayesflow.computational_utilities import simultaneous_ecdf_bands
 from matplotlib.collections import LineCollection
 
+from .ecdf_bands import ecdf_bands
+
 # desaturation_factor = 0.1
 
 # color_dict = {
@@ -73,9 +75,16 @@ for param in color_dict.keys():
         color_dict[param] = gray_color
 
 
+def distinct_colors(num_colors):
+    """Returns num_colors distinguishable colors, for diagnostic plots."""
+
+    cmap = plt.get_cmap("tab10" if num_colors <= 10 else "tab20")
+    return [mcolors.to_hex(cmap(i % cmap.N)) for i in range(num_colors)]
+
+
 def plot_sbc_ecdf(
-    post_samples,
-    prior_samples,
+    post_samples=None,
+    prior_samples=None,
     difference=False,
     stacked=False,
     fig_size=None,
@@ -92,13 +101,16 @@ def plot_sbc_ecdf(
     legend_bbox_to_anchor=None,
     ylim=None,
     title=None,
+    ranks=None,
+    bands=None,
+    hide_ticks=True,
     **kwargs,
 ):
-    # Compute fractional ranks (using broadcasting)
-    ranks = (
-        np.sum(post_samples < prior_samples[:, np.newaxis, :], axis=1)
-        / post_samples.shape[1]
-    )
+    # Fractional ranks, unless precomputed (see src.ranks)
+    if ranks is None:
+        from .ranks import fractional_ranks
+
+        ranks = fractional_ranks(post_samples, prior_samples)
 
     # Prepare figure
     f, ax = plt.subplots(1, 1, figsize=fig_size)
@@ -125,10 +137,11 @@ def plot_sbc_ecdf(
             [0, 0], 0.1, 0.1, facecolor=rank_ecdf_colors[j], label=param_names[j]
         )
 
-    # Compute uniform ECDF and bands
-    alpha, z, L, H = simultaneous_ecdf_bands(
-        post_samples.shape[0], **kwargs.pop("ecdf_bands_kwargs", {})
-    )
+    # Uniform ECDF and bands, cached across plots, unless precomputed as (z, L, H)
+    if bands is None:
+        _, z, L, H = ecdf_bands(ranks.shape[0], **kwargs.pop("ecdf_bands_kwargs", {}))
+    else:
+        z, L, H = (np.array(band) for band in bands)
     if ylim is not None:
         ax.set_ylim(ylim)
 
@@ -167,11 +180,12 @@ def plot_sbc_ecdf(
             ylab = "ECDF"
         _ax.set_ylabel(ylab, fontsize=label_fontsize)
         _ax.set_title(title, fontsize=title_fontsize)
-        # remove x-axis label and ticks
-        _ax.set_xticks([])
-        _ax.set_xticklabels([])
-        _ax.set_yticks([])
-        _ax.set_yticklabels([])
+        if hide_ticks:
+            # remove x-axis label and ticks
+            _ax.set_xticks([])
+            _ax.set_xticklabels([])
+            _ax.set_yticks([])
+            _ax.set_yticklabels([])
 
     f.tight_layout()
     return f
@@ -179,8 +193,8 @@ def plot_sbc_ecdf(
 
 def plot_sbc_ecdf_axis(
     axis,
-    post_samples,
-    prior_samples,
+    post_samples=None,
+    prior_samples=None,
     difference=False,
     stacked=False,
     fig_size=None,
@@ -189,16 +203,18 @@ def plot_sbc_ecdf_axis(
     rank_ecdf_colors=["#009900", "#990000"],
     fill_color="grey",
     ylim=None,
+    ranks=None,
+    bands=None,
     **kwargs,
 ):
     ax = axis
     # Store reference to number of parameters
 
-    # Compute fractional ranks (using broadcasting)
-    ranks = (
-        np.sum(post_samples < prior_samples[:, np.newaxis, :], axis=1)
-        / post_samples.shape[1]
-    )
+    # Fractional ranks, unless precomputed (see src.ranks)
+    if ranks is None:
+        from .ranks import fractional_ranks
+
+        ranks = fractional_ranks(post_samples, prior_samples)
 
     # Plot individual ecdf of parameters
     for j in range(ranks.shape[-1]):
@@ -218,10 +234,11 @@ def plot_sbc_ecdf_axis(
             **kwargs.pop("ecdf_line_kwargs", {}),
         )
 
-    # Compute uniform ECDF and bands
-    alpha, z, L, H = simultaneous_ecdf_bands(
-        post_samples.shape[0], **kwargs.pop("ecdf_bands_kwargs", {})
-    )
+    # Uniform ECDF and bands, cached across plots, unless precomputed as (z, L, H)
+    if bands is None:
+        _, z, L, H = ecdf_bands(ranks.shape[0], **kwargs.pop("ecdf_bands_kwargs", {}))
+    else:
+        z, L, H = (np.array(band) for band in bands)
     if ylim is not None:
         ax.set_ylim(ylim)
 
@@ -315,3 +332,40 @@ def plot_true_vs_ci(
     sns.despine()
 
     return fig
+
+
+def plot_recovery(true, estimate, uncertainty, param_names, **kwargs):
+    """
+    bayesflow's plot_recovery (without R^2), drawn from the point estimates and
+    uncertainties of src.artefacts.recovery_artefact instead of posterior draws.
+    Further keyword arguments are passed on to bayesflow.
+    """
+
+    # imported here, so that the other figures do not load TensorFlow
+    import bayesflow as bf
+
+    # a single draw per data set, whose median is the stored estimate
+    return bf.diagnostics.plot_recovery(
+        estimate[:, np.newaxis],
+        true,
+        point_agg=np.median,
+        uncertainty_agg=lambda post_samples, axis: uncertainty,
+        param_names=param_names,
+        add_r2=False,
+        **kwargs,
+    )
+
+
+def plot_losses(losses, loss_names, **kwargs):
+    """
+    bayesflow's plot_losses, drawn from the loss array and column names of
+    src.artefacts.loss_artefact. Further keyword arguments are passed on to
+    bayesflow.
+    """
+
+    import bayesflow as bf
+    import pandas as pd
+
+    return bf.diagnostics.plot_losses(
+        pd.DataFrame(losses, columns=loss_names), **kwargs
+    )
@@ -1,5 +1,7 @@
 import numpy as np
 
+from .ranks import compute_ranks
+
 
 def posterior_sbc(
     y_obs, trainer, ppred_simulator, num_ppred_samples=200, num_posterior_samples=500
@@ -37,12 +39,6 @@ def posterior_sbc(
         y_obs_configured, n_samples=num_ppred_samples
     )  # posterior_samples_y ~ q_φ(θ|y), shape: (batch_size, num_ppred,)
 
-    _, parameter_dim = posterior_samples_y.shape
-
-    conditional_posterior_samples = np.empty(
-        (num_ppred_samples, num_posterior_samples, parameter_dim)
-    )
-
     # ppred_sample ~ p(y'|y) = ∫q_φ(θ|y)p(y'|θ)dθ, shape: (num_obs, data_dim)
     ppred_sample = ppred_simulator(posterior_samples_y, n_obs=num_obs)
 
@@ -63,3 +59,257 @@ def posterior_sbc(
     )
 
     return posterior_samples_y, conditional_posterior_samples
+
+
+def configure_observed(trainer, sim_data, num_obs):
+    """Configures observed data sets of shape (num_datasets, num_obs, data_dim)."""
+
+    num_params = trainer.amortizer.inference_net.latent_dim
+    return trainer.configurator(
+        {
+            "sim_data": sim_data,
+            "prior_draws": np.zeros(
+                (sim_data.shape[0], num_params), dtype=np.float32
+            ),  # prove that we're not accidentally leaking parameter info
+            "sim_non_batchable_context": num_obs,
+        }
+    )
+
+
+def sample_configured(trainer, configured, num_datasets, n_samples):
+    """Returns posterior samples of shape (num_datasets, n_samples, num_params)."""
+
+    num_params = trainer.amortizer.inference_net.latent_dim
+    samples = trainer.amortizer.sample(configured, n_samples=n_samples)
+    # the amortizer drops the data set axis for a single data set
+    return samples.reshape(num_datasets, n_samples, num_params)
+
+
+def sample_posterior(trainer, sim_data, num_obs, n_samples, batch_size=1024):
+    """
+    Configures the data sets in sim_data, of shape (num_datasets, num_obs,
+    data_dim), and draws n_samples posterior samples for each, batch_size data sets
+    per network call. Returns an array of shape (num_datasets, n_samples, num_params).
+    """
+
+    samples = []
+    for start in range(0, sim_data.shape[0], batch_size):
+        chunk = sim_data[start : start + batch_size]
+        configured = configure_observed(trainer, chunk, num_obs)
+        samples.append(
+            sample_configured(trainer, configured, chunk.shape[0], n_samples)
+        )
+    return np.concatenate(samples)
+
+
+def group_by_num_obs(y_obs) -> dict:
+    """Returns the indices of the data sets in y_obs by their number of observations."""
+
+    groups = {}
+    for i, y in enumerate(y_obs):
+        groups.setdefault(y.shape[0], []).append(i)
+    return groups
+
+
+def simulate_ppred(ppred_simulator, theta, num_obs, rngs=None):
+    """
+    Simulates one posterior predictive data set per draw in theta, of shape
+    (num_datasets, num_draws, num_params), from the stream of each data set in rngs
+    if given. Returns an array of shape (num_datasets * num_draws, num_obs,
+    data_dim).
+    """
+
+    if rngs is None:
+        return ppred_simulator(theta.reshape(-1, theta.shape[-1]), n_obs=num_obs)
+    return np.concatenate(
+        [
+            ppred_simulator(draws, n_obs=num_obs, rng=rng)
+            for draws, rng in zip(theta, rngs)
+        ]
+    )
+
+
+def posterior_sbc_batched(
+    y_obs,
+    trainer,
+    ppred_simulator,
+    num_ppred_samples=200,
+    num_posterior_samples=500,
+    batch_size=1024,
+    rngs=None,
+):
+    """
+    Posterior SBC for many observed data sets at once, see posterior_sbc.
+
+    y_obs:      np.array of shape (num_datasets, num_obs, data_dim), or a list of
+                observed data sets of shape (num_obs, data_dim)
+
+    batch_size: int, default: 1024
+                number of data sets per amortizer call
+
+    rngs:       list of np.random.Generator, optional
+                one stream per observed data set, passed to ppred_simulator as rng
+                for the posterior predictive samples of that data set, so that they
+                do not depend on which other data sets are in the call
+
+    The data sets are grouped by their number of observations. Each group needs two
+    rounds of amortizer calls, for the first-stage posteriors and for the
+    conditional posteriors, and one simulator call for all posterior predictive
+    samples. Returns the posterior samples given y, of shape (num_datasets,
+    num_ppred_samples, num_params), and the conditional posterior samples, of shape
+    (num_datasets, num_ppred_samples, num_posterior_samples, num_params).
+    """
+
+    num_params = trainer.amortizer.inference_net.latent_dim
+    num_datasets = len(y_obs)
+    posterior_samples_y = np.empty(
+        (num_datasets, num_ppred_samples, num_params), dtype=np.float32
+    )
+    conditional_posterior_samples = np.empty(
+        (num_datasets, num_ppred_samples, num_posterior_samples, num_params),
+        dtype=np.float32,
+    )
+
+    for num_obs, indices in group_by_num_obs(y_obs).items():
+        y = np.stack([y_obs[i] for i in indices]).astype(np.float32)
+
+        # posterior_samples_y ~ q_φ(θ|y)
+        samples_y = sample_posterior(
+            trainer, y, num_obs, num_ppred_samples, batch_size=batch_size
+        )
+
+        # ppred_sample ~ p(y'|y) = ∫q_φ(θ|y)p(y'|θ)dθ, one per draw of each data set
+        ppred_sample = simulate_ppred(
+            ppred_simulator,
+            samples_y,
+            num_obs,
+            rngs=None if rngs is None else [rngs[i] for i in indices],
+        )
+
+        y_ppred = np.concatenate(
+            [np.repeat(y, num_ppred_samples, axis=0), ppred_sample], axis=1
+        )
+        conditional_samples = sample_posterior(
+            trainer, y_ppred, 2 * num_obs, num_posterior_samples, batch_size=batch_size
+        )
+
+        posterior_samples_y[indices] = samples_y
+        conditional_posterior_samples[indices] = conditional_samples.reshape(
+            len(indices), num_ppred_samples, num_posterior_samples, num_params
+        )
+
+    return posterior_samples_y, conditional_posterior_samples
+
+
+def posterior_sbc_ranks(
+    y_obs,
+    trainer,
+    ppred_simulator,
+    num_ppred_samples=200,
+    num_posterior_samples=500,
+    ppred_chunk_size=100,
+    sample_chunk_size=500,
+    num_thinned=0,
+    batch_size=1024,
+    rngs=None,
+):
+    """
+    Streaming posterior SBC for many observed data sets, see posterior_sbc_batched,
+    that returns ranks instead of the conditional posterior samples.
+
+    ppred_chunk_size: int, default: 100
+                number of ppred samples per data set simulated and conditioned on
+                at a time
+
+    sample_chunk_size: int, default: 500
+                number of conditional posterior samples drawn per amortizer call
+
+    num_thinned: int, default: 0
+                number of conditional posterior samples kept per ppred sample
+
+    batch_size: int, default: 1024
+                number of data sets per amortizer call
+
+    The conditional posterior samples of a chunk are reduced to rank counts right
+    away, and at most batch_size data sets are passed to the amortizer at a time,
+    so peak memory is bounded by batch_size * sample_chunk_size draws, whatever
+    num_posterior_samples is. Returns the posterior samples given y, of shape
+    (num_datasets, num_ppred_samples, num_params), the rank of each of them among
+    its conditional posterior samples, i.e. the number of samples below it, of the
+    same shape, and the first num_thinned conditional samples, of shape
+    (num_datasets, num_ppred_samples, num_thinned, num_params), or None if
+    num_thinned is 0.
+    """
+
+    num_params = trainer.amortizer.inference_net.latent_dim
+    num_datasets = len(y_obs)
+    posterior_samples_y = np.empty(
+        (num_datasets, num_ppred_samples, num_params), dtype=np.float32
+    )
+    ranks = np.zeros((num_datasets, num_ppred_samples, num_params), dtype=np.int64)
+    thinned = None
+    if num_thinned > 0:
+        thinned = np.empty(
+            (num_datasets, num_ppred_samples, num_thinned, num_params),
+            dtype=np.float32,
+        )
+
+    for num_obs, indices in group_by_num_obs(y_obs).items():
+        y = np.stack([y_obs[i] for i in indices]).astype(np.float32)
+
+        # posterior_samples_y ~ q_φ(θ|y)
+        samples_y = sample_posterior(
+            trainer, y, num_obs, num_ppred_samples, batch_size=batch_size
+        )
+        posterior_samples_y[indices] = samples_y
+
+        for start in range(0, num_ppred_samples, ppred_chunk_size):
+            theta = samples_y[:, start : start + ppred_chunk_size]
+            stop = start + theta.shape[1]
+            num_configured = len(indices) * theta.shape[1]
+
+            # ppred_sample ~ p(y'|y) = ∫q_φ(θ|y)p(y'|θ)dθ
+            ppred_sample = simulate_ppred(
+                ppred_simulator,
+                theta,
+                num_obs,
+                rngs=None if rngs is None else [rngs[i] for i in indices],
+            )
+            y_ppred = np.concatenate(
+                [np.repeat(y, theta.shape[1], axis=0), ppred_sample], axis=1
+            )
+            theta_flat = theta.reshape(-1, num_params)
+            chunk_ranks = np.zeros((num_configured, num_params), dtype=np.int64)
+            chunk_thinned = None
+            if num_thinned > 0:
+                chunk_thinned = np.empty(
+                    (num_configured, num_thinned, num_params), dtype=np.float32
+                )
+
+            # batch_size data sets per amortizer call, as in sample_posterior
+            for batch_start in range(0, num_configured, batch_size):
+                batch = slice(batch_start, batch_start + batch_size)
+                configured = configure_observed(trainer, y_ppred[batch], 2 * num_obs)
+                num_batch = y_ppred[batch].shape[0]
+
+                for draw_start in range(0, num_posterior_samples, sample_chunk_size):
+                    n_samples = min(
+                        sample_chunk_size, num_posterior_samples - draw_start
+                    )
+                    samples = sample_configured(
+                        trainer, configured, num_batch, n_samples
+                    )
+                    chunk_ranks[batch] += compute_ranks(samples, theta_flat[batch])
+                    if draw_start < num_thinned:
+                        n_keep = min(n_samples, num_thinned - draw_start)
+                        chunk_thinned[batch, draw_start : draw_start + n_keep] = (
+                            samples[:, :n_keep]
+                        )
+
+            ranks[indices, start:stop] = chunk_ranks.reshape(theta.shape)
+            if num_thinned > 0:
+                thinned[indices, start:stop] = chunk_thinned.reshape(
+                    len(indices), theta.shape[1], num_thinned, num_params
+                )
+
+    return posterior_samples_y, ranks, thinned
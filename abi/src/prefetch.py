@@ -0,0 +1,254 @@
+import multiprocessing as mp
+import queue
+import time
+from multiprocessing import shared_memory
+
+import numba
+import numpy as np
+
+from .ddm import get_batch_simulator, get_prior
+from .ddm.streams import make_streams
+
+# Worker statistics: batches produced, simulation time, stall time
+NUM_STATS = 3
+
+
+def passthrough_configurator(forward_dict: dict) -> dict:
+    """Configurator for batches that were already configured by the workers."""
+    return forward_dict
+
+
+def slot_shapes(batch_size, max_num_obs, num_params, data_dim=3):
+    return {
+        "summary_conditions": (batch_size, max_num_obs, data_dim),
+        "direct_conditions": (batch_size, 1),
+        "parameters": (batch_size, num_params),
+    }
+
+
+def slot_views(buffer, shapes):
+    """Returns float32 arrays of the given shapes, laid out one after the other."""
+    views = {}
+    offset = 0
+    for key, shape in shapes.items():
+        views[key] = np.ndarray(shape, dtype=np.float32, buffer=buffer, offset=offset)
+        offset += int(np.prod(shape)) * 4
+    return views
+
+
+def slot_nbytes(shapes):
+    return sum(int(np.prod(shape)) * 4 for shape in shapes.values())
+
+
+def produce_batches(
+    worker_idx,
+    shm_name,
+    shapes,
+    free_slots,
+    ready_slots,
+    stop,
+    stats,
+    model_name,
+    batch_size,
+    num_obs_fun,
+    configurator,
+    simulator_kwargs,
+    seed,
+    num_threads,
+):
+    """
+    Worker loop: simulates and configures batches and writes them into free slots
+    of the shared memory block, until stop is set. A parallel simulator runs on
+    num_threads numba threads.
+    """
+
+    numba.set_num_threads(num_threads)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    nbytes = slot_nbytes(shapes)
+    streams = make_streams(seed)
+    prior = get_prior(model_name, rng=streams["prior"])
+    batch_simulator = get_batch_simulator(
+        model_name, rng=streams["simulator"], **simulator_kwargs
+    )
+    max_num_obs = shapes["summary_conditions"][1]
+
+    try:
+        while not stop.is_set():
+            start = time.perf_counter()
+            num_obs = int(num_obs_fun(rng=streams["context"]))
+            if num_obs > max_num_obs:
+                raise ValueError(f"{num_obs} observations exceed the slot size")
+            prior_draws = prior(batch_size)
+            out = configurator(
+                {
+                    "prior_draws": prior_draws,
+                    "sim_data": batch_simulator(prior_draws, num_obs),
+                    "sim_non_batchable_context": num_obs,
+                }
+            )
+            stats[worker_idx * NUM_STATS + 1] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            while True:
+                try:
+                    slot = free_slots.get(timeout=0.1)
+                    break
+                except queue.Empty:
+                    if stop.is_set():
+                        return
+            stats[worker_idx * NUM_STATS + 2] += time.perf_counter() - start
+
+            views = slot_views(shm.buf[slot * nbytes : (slot + 1) * nbytes], shapes)
+            views["summary_conditions"][:, :num_obs] = out["summary_conditions"]
+            views["direct_conditions"][:] = out["direct_conditions"]
+            views["parameters"][:] = out["parameters"]
+            del views
+            ready_slots.put((slot, num_obs))
+            stats[worker_idx * NUM_STATS] += 1
+    finally:
+        shm.close()
+
+
+class PrefetchingGenerativeModel:
+    """
+    Generative model that hands out configured batches simulated ahead of time by
+    a pool of worker processes, so that simulation overlaps the gradient steps.
+
+    Batches are written into slots of one shared memory block and only slot
+    indices travel through the queues. There are queue_depth slots plus the one
+    the trainer holds, so at most queue_depth batches wait for the trainer and the
+    workers stall once all are filled. The returned arrays are views into a slot,
+    which is handed back to the workers on the next call. As the batches are
+    configured already, pass passthrough_configurator to the trainer.
+    Batches smaller than batch_size (e.g. the trainer's consistency check) are
+    cut from a full batch.
+
+    With a parallel simulator, the numba threads of the calling process are split
+    among the workers, so that they do not oversubscribe the cores.
+    """
+
+    def __init__(
+        self,
+        model_name,
+        batch_size,
+        num_params,
+        num_obs_fun,
+        max_num_obs,
+        configurator,
+        simulator_kwargs=None,
+        num_workers=2,
+        queue_depth=8,
+        seed=None,
+    ):
+        self.batch_size = batch_size
+        self.queue_depth = queue_depth
+        self.shapes = slot_shapes(batch_size, max_num_obs, num_params)
+        self.nbytes = slot_nbytes(self.shapes)
+        num_slots = queue_depth + 1
+
+        ctx = mp.get_context("spawn")
+        self.shm = shared_memory.SharedMemory(create=True, size=num_slots * self.nbytes)
+        self.free_slots = ctx.Queue()
+        for slot in range(num_slots):
+            self.free_slots.put(slot)
+        self.ready_slots = ctx.Queue()
+        self.stop = ctx.Event()
+        self.stats = ctx.Array("d", num_workers * NUM_STATS, lock=False)
+        num_threads = max(1, numba.get_num_threads() // num_workers)
+
+        self.workers = [
+            ctx.Process(
+                target=produce_batches,
+                args=(
+                    worker_idx,
+                    self.shm.name,
+                    self.shapes,
+                    self.free_slots,
+                    self.ready_slots,
+                    self.stop,
+                    self.stats,
+                    model_name,
+                    batch_size,
+                    num_obs_fun,
+                    configurator,
+                    simulator_kwargs or {},
+                    seed_seq,
+                    num_threads,
+                ),
+                daemon=True,
+            )
+            for worker_idx, seed_seq in enumerate(
+                np.random.SeedSequence(seed).spawn(num_workers)
+            )
+        ]
+        for worker in self.workers:
+            worker.start()
+
+        self.current_slot = None
+        self.num_batches = 0
+        self.consumer_stall = 0.0
+        self.start_time = time.perf_counter()
+
+    def __call__(self, batch_size: int) -> dict:
+        if batch_size > self.batch_size:
+            raise ValueError(f"Batches are prefetched with size {self.batch_size}")
+
+        if self.current_slot is not None:
+            self.free_slots.put(self.current_slot)
+            self.current_slot = None
+
+        start = time.perf_counter()
+        while True:
+            try:
+                slot, num_obs = self.ready_slots.get(timeout=1.0)
+                break
+            except queue.Empty:
+                if not any(worker.is_alive() for worker in self.workers):
+                    raise RuntimeError("All prefetch workers have exited")
+        self.consumer_stall += time.perf_counter() - start
+        self.num_batches += 1
+        self.current_slot = slot
+
+        views = slot_views(
+            self.shm.buf[slot * self.nbytes : (slot + 1) * self.nbytes], self.shapes
+        )
+        return {
+            "summary_conditions": views["summary_conditions"][:batch_size, :num_obs],
+            "direct_conditions": views["direct_conditions"][:batch_size],
+            "parameters": views["parameters"][:batch_size],
+        }
+
+    def report(self) -> str:
+        """Returns a text summary of the producer and consumer stall times."""
+
+        wall_time = time.perf_counter() - self.start_time
+        stats = np.frombuffer(self.stats, dtype=np.float64).reshape(-1, NUM_STATS)
+        produced = stats[:, 0].sum()
+        lines = [
+            f"batches consumed: {self.num_batches}, produced: {produced:.0f}, "
+            f"workers: {len(self.workers)}, queue depth: {self.queue_depth}",
+            f"consumer stall: {self.consumer_stall:.2f}s "
+            f"({self.consumer_stall / wall_time:.1%} of {wall_time:.1f}s wall time)",
+        ]
+        for worker_idx, (n, sim_time, stall) in enumerate(stats):
+            lines.append(
+                f"worker {worker_idx}: {n:.0f} batches, "
+                f"{sim_time / max(n, 1) * 1e3:.1f}ms per batch, "
+                f"producer stall {stall:.2f}s"
+            )
+        return "\n".join(lines)
+
+    def close(self):
+        """Stops the workers and releases the shared memory."""
+
+        self.stop.set()
+        for worker in self.workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        try:
+            self.shm.close()
+        except BufferError:
+            # the last batch handed out still references the block
+            pass
+        self.shm.unlink()
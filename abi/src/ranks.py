@@ -0,0 +1,54 @@
+import numpy as np
+from numba import njit, prange
+
+TIES = ("lower", "random")
+
+
+@njit(parallel=True, cache=True)
+def count_below_equal(post_samples, prior_samples):
+    """
+    Counts, for every data set and parameter, the posterior samples below and
+    equal to the prior sample, without materialising the comparison.
+    """
+
+    num_datasets, num_samples, num_params = post_samples.shape
+    below = np.zeros((num_datasets, num_params), dtype=np.int64)
+    equal = np.zeros((num_datasets, num_params), dtype=np.int64)
+    for i in prange(num_datasets):
+        for k in range(num_samples):
+            for j in range(num_params):
+                if post_samples[i, k, j] < prior_samples[i, j]:
+                    below[i, j] += 1
+                elif post_samples[i, k, j] == prior_samples[i, j]:
+                    equal[i, j] += 1
+    return below, equal
+
+
+def compute_ranks(post_samples, prior_samples, ties="lower", rng=None):
+    """
+    Returns the SBC ranks of the prior samples, of shape (num_datasets, num_params),
+    among the posterior samples, of shape (num_datasets, num_samples, num_params).
+
+    ties 'lower' counts the posterior samples strictly below the prior sample.
+    ties 'random' adds a uniform draw from 0 to the number of tied samples, which
+    keeps the ranks uniform for discrete or rounded posteriors.
+    """
+
+    if ties not in TIES:
+        raise ValueError(f"Unknown tie handling: {ties}")
+
+    below, equal = count_below_equal(
+        np.asarray(post_samples), np.asarray(prior_samples)
+    )
+    if ties == "random":
+        if rng is None:
+            rng = np.random.default_rng()
+        below += rng.integers(0, equal + 1)
+    return below
+
+
+def fractional_ranks(post_samples, prior_samples, ties="lower", rng=None):
+    """Returns the ranks of compute_ranks divided by the number of samples."""
+
+    ranks = compute_ranks(post_samples, prior_samples, ties=ties, rng=rng)
+    return ranks / np.shape(post_samples)[1]
@@ -0,0 +1,57 @@
+import os
+from multiprocessing import get_context
+
+from .artefacts import load_artefact
+
+
+def render_figure(figure: dict) -> str:
+    """Draws one figure of a manifest (see src.artefacts) and saves it."""
+
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    from .plot_utils import plot_losses, plot_recovery, plot_sbc_ecdf
+
+    artefact = load_artefact(figure["artefact"])
+    options = figure.get("options", {})
+    if figure["kind"] == "losses":
+        f = plot_losses(artefact["losses"], list(artefact["loss_names"]), **options)
+    elif figure["kind"] == "sbc_ecdf":
+        f = plot_sbc_ecdf(
+            ranks=artefact["ranks"],
+            bands=(artefact["z"], artefact["L"], artefact["H"]),
+            **options,
+        )
+    elif figure["kind"] == "recovery":
+        f = plot_recovery(
+            artefact["true"],
+            artefact["estimate"],
+            artefact["uncertainty"],
+            **options,
+        )
+    else:
+        raise ValueError(f"Unknown figure kind: {figure['kind']}")
+
+    f.savefig(figure["output"])
+    plt.close(f)
+    return figure["output"]
+
+
+def render_figures(figures: list, num_workers: int = None) -> list:
+    """
+    Renders the figures headless on a process pool and returns the written files.
+    The SBC figures only need matplotlib and the plotting code; the loss and
+    recovery figures are drawn by bayesflow, which loads TensorFlow.
+    """
+
+    if num_workers is None:
+        num_workers = os.cpu_count()
+    num_workers = max(1, min(num_workers, len(figures)))
+    if num_workers == 1:
+        return [render_figure(figure) for figure in figures]
+
+    # spawn, so that workers do not inherit the state of a TensorFlow parent
+    with get_context("spawn").Pool(num_workers) as pool:
+        return pool.map(render_figure, figures, chunksize=1)
@@ -0,0 +1,77 @@
+import glob
+import json
+import os
+
+import numpy as np
+
+from .io_utils import atomic_save
+
+CONFIG_FILE = "config.json"
+
+
+class ResultsStore:
+    """
+    Append-only store of per-subject results in results_dir.
+
+    Every append writes one new part-<n>.npz file of arrays whose first axis runs
+    over the subjects in its 'subject_ids' array; existing parts are never
+    modified. config (e.g. model, checkpoint and sample counts) is saved with the
+    first part, and reopening the store with a different config raises a
+    ValueError, so results of different runs are never mixed.
+    """
+
+    def __init__(self, results_dir: str, config: dict):
+        self.results_dir = results_dir
+        os.makedirs(results_dir, exist_ok=True)
+
+        stored_config = self.stored_config(results_dir)
+        if stored_config is None:
+            path = os.path.join(results_dir, CONFIG_FILE)
+            with atomic_save(path) as tmp_path:
+                with open(tmp_path, "w") as f:
+                    json.dump(config, f, indent=2)
+        elif stored_config != config:
+            raise ValueError(
+                f"{results_dir} holds results for {stored_config}, not {config}"
+            )
+
+    @staticmethod
+    def stored_config(results_dir: str):
+        """Returns the config of the results in results_dir, or None."""
+
+        path = os.path.join(results_dir, CONFIG_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def parts(self) -> list:
+        return sorted(glob.glob(os.path.join(self.results_dir, "part-*[0-9].npz")))
+
+    def done_subjects(self) -> set:
+        done = set()
+        for path in self.parts():
+            with np.load(path) as part:
+                done.update(part["subject_ids"].tolist())
+        return done
+
+    def append(self, **arrays):
+        if "subject_ids" not in arrays:
+            raise ValueError("Results need subject_ids")
+        path = os.path.join(self.results_dir, f"part-{len(self.parts()):05d}.npz")
+        # an interrupted run never leaves a partial part
+        with atomic_save(path) as tmp_path:
+            np.savez(tmp_path, **arrays)
+
+    def load(self) -> dict:
+        """Returns all results, concatenated over the parts."""
+
+        parts = []
+        for path in self.parts():
+            with np.load(path) as part:
+                parts.append({name: part[name] for name in part.files})
+        if not parts:
+            return {}
+        return {
+            name: np.concatenate([part[name] for part in parts]) for name in parts[0]
+        }
@@ -0,0 +1,160 @@
+import glob
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .io_utils import INDEX_FILE, atomic_save, read_index, write_index
+
+# Default location of the subject files and of their cache, relative to the abi
+# directory
+SUBJECT_PATTERN = "data/sub-*_task-pdm_acq-outsideMRT_runs_beh_n200lat.csv"
+CACHE_DIR = "cache/subjects"
+
+TRIALS_FILE = "trials.npy"
+
+
+def discover_subjects(pattern: str = SUBJECT_PATTERN) -> dict:
+    """Returns the files matching pattern by subject id, read from 'sub-<id>_'."""
+
+    subjects = {}
+    for path in glob.glob(pattern):
+        match = re.search(r"sub-(\d+)_", os.path.basename(path))
+        if match is not None:
+            subjects[int(match.group(1))] = path
+    return dict(sorted(subjects.items()))
+
+
+def preprocess_subject(path: str) -> np.ndarray:
+    """
+    Reads a subject file into trials [rt_signed, n200lat], with the response time
+    negative for incorrect responses, dropping trials with n200lat <= -10.
+    """
+
+    import pandas as pd
+
+    df = pd.read_csv(path)
+    df["response_corr"] = df["response_corr"].replace(0, -1)
+    trials = np.array([df["response_time"] * df["response_corr"], df["n200lat"]]).T
+    return trials[trials[:, 1] > -10]
+
+
+def source_stamp(path: str) -> list:
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def build_subject_cache(
+    pattern: str = SUBJECT_PATTERN, cache_dir: str = CACHE_DIR, num_workers=None
+) -> dict:
+    """
+    Brings the cache of all subject files matching pattern up to date and returns
+    its index.
+
+    The cache is one .npy file with the preprocessed trials of all subjects, one
+    after the other, and index.json with the offset, trial count and source stamp
+    (modification time, size) of every subject. Subjects whose file is unchanged
+    are copied from the previous cache; new and changed files are preprocessed in
+    parallel on num_workers processes. Raises a FileNotFoundError if no file
+    matches pattern.
+    """
+
+    subjects = discover_subjects(pattern)
+    if not subjects:
+        raise FileNotFoundError(f"No subject files match {pattern}")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    stamps = {str(subject): source_stamp(path) for subject, path in subjects.items()}
+
+    old_index, old_trials = {"subjects": {}}, None
+    if os.path.exists(os.path.join(cache_dir, INDEX_FILE)):
+        old_index = read_index(cache_dir)
+        old_trials = np.load(os.path.join(cache_dir, TRIALS_FILE), mmap_mode="r")
+    if old_index["subjects"].keys() == stamps.keys() and all(
+        entry["stamp"] == stamps[subject]
+        for subject, entry in old_index["subjects"].items()
+    ):
+        return old_index
+
+    changed = [
+        subject
+        for subject in subjects
+        if old_index["subjects"].get(str(subject), {}).get("stamp")
+        != stamps[str(subject)]
+    ]
+    with ProcessPoolExecutor(max_workers=num_workers) as pool:
+        preprocessed = dict(
+            zip(
+                changed,
+                pool.map(
+                    preprocess_subject,
+                    [subjects[subject] for subject in changed],
+                    chunksize=max(1, len(changed) // (4 * (os.cpu_count() or 1))),
+                ),
+            )
+        )
+
+    counts = {}
+    for subject in subjects:
+        if subject in preprocessed:
+            counts[subject] = preprocessed[subject].shape[0]
+        else:
+            counts[subject] = old_index["subjects"][str(subject)]["count"]
+
+    index = {"subjects": {}}
+    with atomic_save(os.path.join(cache_dir, TRIALS_FILE)) as tmp_path:
+        trials = np.lib.format.open_memmap(
+            tmp_path, mode="w+", dtype=np.float64, shape=(sum(counts.values()), 2)
+        )
+        offset = 0
+        for subject in subjects:
+            count = counts[subject]
+            if subject in preprocessed:
+                trials[offset : offset + count] = preprocessed[subject]
+            else:
+                old_offset = old_index["subjects"][str(subject)]["offset"]
+                trials[offset : offset + count] = old_trials[
+                    old_offset : old_offset + count
+                ]
+            index["subjects"][str(subject)] = {
+                "offset": offset,
+                "count": count,
+                "stamp": stamps[str(subject)],
+            }
+            offset += count
+        trials.flush()
+        del trials, old_trials
+    write_index(cache_dir, index)
+
+    print(f"Preprocessed {len(changed)} of {len(subjects)} subjects into {cache_dir}")
+    return index
+
+
+def load_subjects(
+    subject_ids=None,
+    num_obs=None,
+    pattern: str = SUBJECT_PATTERN,
+    cache_dir: str = CACHE_DIR,
+    num_workers=None,
+) -> dict:
+    """
+    Returns the preprocessed trials of the given subjects (default: all) by subject
+    id, truncated to the first num_obs trials. The arrays are read-only views into
+    the memory-mapped cache, which is updated first if subject files changed.
+    """
+
+    index = build_subject_cache(pattern, cache_dir, num_workers)
+    trials = np.load(os.path.join(cache_dir, TRIALS_FILE), mmap_mode="r")
+
+    if subject_ids is None:
+        subject_ids = [int(subject) for subject in index["subjects"]]
+
+    subjects = {}
+    for subject in subject_ids:
+        if str(subject) not in index["subjects"]:
+            raise KeyError(f"No data for subject {subject} matching {pattern}")
+        entry = index["subjects"][str(subject)]
+        count = entry["count"] if num_obs is None else min(entry["count"], num_obs)
+        subjects[subject] = trials[entry["offset"] : entry["offset"] + count]
+    return subjects
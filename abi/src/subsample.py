@@ -0,0 +1,85 @@
+import numpy as np
+
+SUBSAMPLE_MODES = ("prefix", "subset")
+
+
+class SubsamplingGenerativeModel:
+    """
+    Generative model that simulates every parameter draw once with num_obs_max
+    trials and derives num_reuse data sets of varying size from it. Trials are
+    i.i.d. given the parameters, so the first num_obs trials (mode 'prefix') or a
+    random subset of num_obs trials (mode 'subset') form a valid data set of size
+    num_obs.
+
+    A pool of num_reuse * batch_size draws is simulated in one call. Its batches
+    are cut from num_reuse shuffles of the pool, so every draw enters num_reuse
+    different batches, next to different draws, before the pool is replaced.
+    """
+
+    def __init__(
+        self,
+        prior,
+        batch_simulator,
+        num_obs_fun,
+        num_obs_max,
+        num_reuse=4,
+        mode="prefix",
+        rng=None,
+    ):
+        if mode not in SUBSAMPLE_MODES:
+            raise ValueError(f"Unknown subsample mode: {mode}")
+        self.prior = prior
+        self.batch_simulator = batch_simulator
+        self.num_obs_fun = num_obs_fun
+        self.num_obs_max = num_obs_max
+        self.num_reuse = num_reuse
+        self.mode = mode
+        self.rng = np.random.default_rng() if rng is None else rng
+
+        self.prior_draws = None
+        self.sim_data = None
+        self.batches = []
+        self.batch_size = None
+        self.num_simulated = 0
+        self.num_served = 0
+
+    def _new_pool(self, batch_size):
+        pool_size = self.num_reuse * batch_size
+        self.prior_draws = self.prior(pool_size)
+        self.sim_data = self.batch_simulator(self.prior_draws, self.num_obs_max)
+        self.batches = [
+            indices
+            for _ in range(self.num_reuse)
+            for indices in np.split(self.rng.permutation(pool_size), self.num_reuse)
+        ]
+        self.batch_size = batch_size
+        self.num_simulated += pool_size
+
+    def __call__(self, batch_size: int) -> dict:
+        if batch_size != self.batch_size or not self.batches:
+            self._new_pool(batch_size)
+
+        num_obs = int(self.num_obs_fun())
+        if num_obs > self.num_obs_max:
+            raise ValueError(f"{num_obs} observations exceed num_obs_max")
+
+        indices = self.batches.pop()
+        if self.mode == "prefix":
+            sim_data = self.sim_data[indices, :num_obs]
+        else:
+            trials = np.argsort(
+                self.rng.random((batch_size, self.num_obs_max)), axis=1
+            )[:, :num_obs]
+            sim_data = np.take_along_axis(
+                self.sim_data[indices], trials[..., np.newaxis], axis=1
+            )
+        self.num_served += batch_size
+
+        return {
+            "prior_non_batchable_context": None,
+            "prior_batchable_context": None,
+            "prior_draws": self.prior_draws[indices],
+            "sim_non_batchable_context": num_obs,
+            "sim_batchable_context": None,
+            "sim_data": sim_data,
+        }
@@ -1,19 +1,49 @@
+import argparse
 from functools import partial
 
-import bayesflow as bf
-from src.argparser import parse_args
+from src.argparser import parse_args, shared_parser, simulator_kwargs
 from src.config import cfg
-from src.ddm import (
-    configurator,
-    get_batch_simulator,
-    get_prior,
-    random_num_obs,
-    random_num_obs_mixture,
-)
-from src.models import get_amortizer
 
-if __name__ == "__main__":
-    args = parse_args()
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description="Print simulated and configured batches of a model.",
+        parents=[shared_parser()],
+    )
+    group = parser.add_argument_group("simulator")
+
+    group.add_argument(
+        "--instrument_simulator",
+        action="store_true",
+        help="Record per-batch step statistics of the simulator and report them.",
+    )
+
+    return parser
+
+
+def main(args):
+    # imported here, so that --help does not load TensorFlow
+    import bayesflow as bf
+    import numba
+    from src.ddm import (
+        configurator,
+        get_batch_simulator,
+        get_instrumented_simulator,
+        get_prior,
+        random_num_obs,
+        random_num_obs_mixture,
+    )
+    from src.ddm.kernel import warm_up
+    from src.ddm.streams import make_streams
+    from src.models import get_amortizer
+
+    if args.num_threads is not None:
+        numba.set_num_threads(args.num_threads)
+
+    if args.warm_up:
+        warm_up(parallel=args.parallel, background=True)
+
+    streams = make_streams(args.seed)
 
     param_names = cfg.param_names[args.model]
 
@@ -22,21 +52,44 @@ if __name__ == "__main__":
     if args.nobs_fun == "uniform":
         context_gen = bf.simulation.ContextGenerator(
             non_batchable_context_fun=partial(
-                random_num_obs, num_obs_min=cfg.num_obs_min, num_obs_max=cfg.num_obs_max
+                random_num_obs,
+                num_obs_min=cfg.num_obs_min,
+                num_obs_max=cfg.num_obs_max,
+                rng=streams["context"],
             )
         )
     elif args.nobs_fun == "mixture":
         context_gen = bf.simulation.ContextGenerator(
             non_batchable_context_fun=partial(
-                random_num_obs_mixture, num_obs_target=cfg.num_test_datasets
+                random_num_obs_mixture,
+                num_obs_target=cfg.num_test_datasets,
+                rng=streams["context"],
             )
         )
     else:
         raise ValueError("Invalid nobs_fun")
 
-    prior = bf.simulation.Prior(batch_prior_fun=get_prior(args.model))
+    prior = bf.simulation.Prior(
+        batch_prior_fun=get_prior(args.model, rng=streams["prior"])
+    )
+    if args.instrument_simulator:
+        batch_simulator = get_instrumented_simulator(
+            args.model,
+            parallel=args.parallel,
+            backend=args.simulator_backend,
+            rng=streams["simulator"],
+            **simulator_kwargs(args),
+        )
+    else:
+        batch_simulator = get_batch_simulator(
+            args.model,
+            parallel=args.parallel,
+            backend=args.simulator_backend,
+            rng=streams["simulator"],
+            **simulator_kwargs(args),
+        )
     simulator = bf.simulation.Simulator(
-        batch_simulator_fun=get_batch_simulator(args.model),
+        batch_simulator_fun=batch_simulator,
         context_generator=context_gen,
     )
     generative_model = bf.simulation.GenerativeModel(prior=prior, simulator=simulator)
@@ -65,3 +118,10 @@ if __name__ == "__main__":
             except Exception:
                 print(d)
         print("-------------")
+
+    if args.instrument_simulator:
+        print(batch_simulator.report())
+
+
+if __name__ == "__main__":
+    main(parse_args(get_parser()))
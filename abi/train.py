@@ -1,59 +1,259 @@
+import argparse
+import os
 from functools import partial
 
-import bayesflow as bf
-from src.argparser import parse_args
+from src.argparser import parse_args, shared_parser, simulator_kwargs
 from src.config import cfg
-from src.ddm import (
-    configurator,
-    get_batch_simulator,
-    get_prior,
-    random_num_obs,
-    random_num_obs_mixture,
-)
-from src.models import get_amortizer
 
-if __name__ == "__main__":
-    args = parse_args()
+# Written into the checkpoint directory once training has finished
+TRAIN_DONE = "train_done"
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description="Train the amortizer of a model.", parents=[shared_parser()]
+    )
+    group = parser.add_argument_group("training data")
+
+    group.add_argument(
+        "--bank_dir",
+        type=str,
+        default=None,
+        help="Simulation bank written by simulate.py. If given, the training "
+        "batches are streamed from the bank instead of simulated.",
+    )
+
+    group.add_argument(
+        "--prefetch_workers",
+        type=int,
+        default=0,
+        help="Number of worker processes that simulate training batches ahead of "
+        "the trainer (0: simulate in the training loop).",
+    )
+
+    group.add_argument(
+        "--prefetch_depth",
+        type=int,
+        default=8,
+        help="Maximum number of prefetched batches waiting for the trainer.",
+    )
+
+    group.add_argument(
+        "--subsample_reuse",
+        type=int,
+        default=1,
+        help="Number of data sets derived from each simulated parameter draw, by "
+        "subsampling trials of one simulation at the largest num_obs (1: off).",
+    )
+
+    group.add_argument(
+        "--subsample_mode",
+        type=str,
+        default="prefix",
+        help="How the trials of a derived data set are chosen.",
+        choices=["prefix", "subset"],
+    )
+
+    group.add_argument(
+        "--simulator_layout",
+        type=str,
+        default="signed",
+        help="Output layout of the training simulator: signed RTs and N200, or "
+        "the summary network input (|RT|, response, N200).",
+        choices=["signed", "network"],
+    )
+
+    group.add_argument(
+        "--instrument_simulator",
+        action="store_true",
+        help="Record per-batch step statistics of the simulator and report them.",
+    )
+
+    return parser
+
+
+def check_args(parser, args):
+    """Rejects training data options that do not combine."""
+
+    sources = [
+        option
+        for option, used in [
+            ("--bank_dir", args.bank_dir is not None),
+            ("--prefetch_workers", args.prefetch_workers > 0),
+            ("--subsample_reuse", args.subsample_reuse > 1),
+        ]
+        if used
+    ]
+    if len(sources) > 1:
+        parser.error(f"{' and '.join(sources)} cannot be combined")
+    # marked trials have NaN response times, which would make the loss NaN
+    if simulator_kwargs(args).get("censoring") == "mark" and args.max_steps > 0:
+        parser.error("--censoring mark leaves NaN trials in the training data")
+    # the instrumented simulator only runs in the training loop
+    if args.instrument_simulator and sources in (
+        ["--bank_dir"],
+        ["--prefetch_workers"],
+    ):
+        parser.error(f"--instrument_simulator cannot be combined with {sources[0]}")
+    # the bank was simulated by simulate.py, whose settings it records
+    if args.parallel and sources == ["--bank_dir"]:
+        parser.error("--parallel has no effect with --bank_dir")
+
+
+def main(args):
+    # imported here, so that --help does not load TensorFlow
+    import bayesflow as bf
+    import numba
+    from src.bank import SimulationBank, bank_simulator
+    from src.ddm import (
+        Configurator,
+        get_batch_simulator,
+        get_instrumented_simulator,
+        get_prior,
+        random_num_obs,
+        random_num_obs_mixture,
+    )
+    from src.ddm.kernel import warm_up
+    from src.ddm.streams import make_streams
+    from src.models import get_amortizer
+    from src.prefetch import PrefetchingGenerativeModel, passthrough_configurator
+    from src.subsample import SubsamplingGenerativeModel
+
+    if args.num_threads is not None:
+        numba.set_num_threads(args.num_threads)
+
+    if args.warm_up:
+        warm_up(parallel=args.parallel, background=True)
+
+    streams = make_streams(args.seed)
 
     param_names = cfg.param_names[args.model]
 
     num_params = len(param_names)
 
     if args.nobs_fun == "uniform":
-        context_gen = bf.simulation.ContextGenerator(
-            non_batchable_context_fun=partial(
-                random_num_obs, num_obs_min=cfg.num_obs_min, num_obs_max=cfg.num_obs_max
-            )
+        num_obs_fun = partial(
+            random_num_obs, num_obs_min=cfg.num_obs_min, num_obs_max=cfg.num_obs_max
         )
+        max_num_obs = cfg.num_obs_max
     elif args.nobs_fun == "mixture":
-        context_gen = bf.simulation.ContextGenerator(
-            non_batchable_context_fun=partial(
-                random_num_obs_mixture, num_obs_target=cfg.num_test_observations
-            )
+        num_obs_fun = partial(
+            random_num_obs_mixture, num_obs_target=cfg.num_test_observations
         )
+        # 10 standard deviations above the upper mode
+        max_num_obs = 2 * cfg.num_test_observations + 100
     else:
         raise ValueError("Invalid nobs_fun")
 
-    prior = bf.simulation.Prior(batch_prior_fun=get_prior(args.model))
+    context_gen = bf.simulation.ContextGenerator(
+        non_batchable_context_fun=partial(num_obs_fun, rng=streams["context"])
+    )
+
+    prior = bf.simulation.Prior(
+        batch_prior_fun=get_prior(args.model, rng=streams["prior"])
+    )
+    simulator_options = dict(simulator_kwargs(args), layout=args.simulator_layout)
+    if args.instrument_simulator:
+        batch_simulator = get_instrumented_simulator(
+            args.model,
+            parallel=args.parallel,
+            backend=args.simulator_backend,
+            rng=streams["simulator"],
+            **simulator_options,
+        )
+    else:
+        batch_simulator = get_batch_simulator(
+            args.model,
+            parallel=args.parallel,
+            backend=args.simulator_backend,
+            rng=streams["simulator"],
+            **simulator_options,
+        )
     simulator = bf.simulation.Simulator(
-        batch_simulator_fun=get_batch_simulator(args.model),
+        batch_simulator_fun=batch_simulator,
         context_generator=context_gen,
     )
-    generative_model = bf.simulation.GenerativeModel(prior=prior, simulator=simulator)
-    print(num_params)
-    amortizer = get_amortizer(cfg, num_params)
+    if args.bank_dir is not None:
+        generative_model = SimulationBank(
+            args.bank_dir,
+            model_name=args.model,
+            rng=streams["bank"],
+            simulator=bank_simulator(
+                args.model, args.simulator_backend, **simulator_options
+            ),
+        )
+    elif args.prefetch_workers > 0:
+        generative_model = PrefetchingGenerativeModel(
+            args.model,
+            batch_size=cfg.batch_size,
+            num_params=num_params,
+            num_obs_fun=num_obs_fun,
+            max_num_obs=max_num_obs,
+            configurator=Configurator(views=True),
+            simulator_kwargs=dict(
+                parallel=args.parallel,
+                backend=args.simulator_backend,
+                **simulator_options,
+            ),
+            num_workers=args.prefetch_workers,
+            queue_depth=args.prefetch_depth,
+            seed=args.seed,
+        )
+    elif args.subsample_reuse > 1:
+        generative_model = SubsamplingGenerativeModel(
+            prior=get_prior(args.model, rng=streams["prior"]),
+            batch_simulator=batch_simulator,
+            num_obs_fun=context_gen.non_batchable_context_fun,
+            num_obs_max=max_num_obs,
+            num_reuse=args.subsample_reuse,
+            mode=args.subsample_mode,
+            rng=streams["subsample"],
+        )
+    else:
+        generative_model = bf.simulation.GenerativeModel(
+            prior=prior, simulator=simulator
+        )
 
-    trainer = bf.trainers.Trainer(
-        amortizer=amortizer,
-        generative_model=generative_model,
-        configurator=configurator,
-        default_lr=cfg.default_lr,
-        checkpoint_path=args.checkpoint_name,
-        max_to_keep=1,
-    )
+    # the prefetch workers and their shared memory are released also when
+    # training fails or is interrupted
+    try:
+        print(num_params)
+        amortizer = get_amortizer(cfg, num_params)
 
-    h = trainer.train_online(
-        epochs=cfg.epochs,
-        iterations_per_epoch=cfg.iterations_per_epoch,
-        batch_size=cfg.batch_size,
-    )
+        trainer = bf.trainers.Trainer(
+            amortizer=amortizer,
+            generative_model=generative_model,
+            configurator=(
+                passthrough_configurator
+                if isinstance(generative_model, PrefetchingGenerativeModel)
+                # every batch is consumed before the next one is configured
+                else Configurator(views=True)
+            ),
+            default_lr=cfg.default_lr,
+            checkpoint_path=args.checkpoint_name,
+            max_to_keep=1,
+        )
+
+        h = trainer.train_online(
+            epochs=cfg.epochs,
+            iterations_per_epoch=cfg.iterations_per_epoch,
+            batch_size=cfg.batch_size,
+        )
+    finally:
+        if isinstance(generative_model, PrefetchingGenerativeModel):
+            generative_model.close()
+
+    if args.instrument_simulator:
+        print(batch_simulator.report())
+
+    if isinstance(generative_model, PrefetchingGenerativeModel):
+        print(generative_model.report())
+
+    open(os.path.join(args.checkpoint_name, TRAIN_DONE), "w").close()
+
+
+if __name__ == "__main__":
+    parser = get_parser()
+    args = parse_args(parser)
+    check_args(parser, args)
+    main(args)